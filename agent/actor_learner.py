@@ -0,0 +1,155 @@
+import multiprocessing as mp
+import os
+import queue
+import random
+import traceback
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+
+from dqn_agent import DQNAgent
+from env.exit_journal import ExitJournal
+from env.step_log import StepLogWriter
+from env.tracing import Tracer
+from env.vector_env import VectorWarehouseEnvironment
+from training_env import ACTION_SIZE, STATE_SIZE, make_env
+
+TRANSITION_DTYPES = (np.float32, np.int32, np.float32, np.float32, np.float32)  # 发给 learner 的 (s, a, r, s', done)
+
+
+def make_worker_env(index, csv_file, yard=0):
+    # 每个 worker 的每个场地写自己的记录文件，不与其他进程、其他场地交错
+    current_date = datetime.now().strftime('%Y-%m-%d')
+    return make_env(csv_file, tracer=Tracer.quiet(),
+                    step_log=StepLogWriter(f"{current_date}_simulation_records_worker{index}_{yard}.csv"),
+                    exit_journal=ExitJournal(f"{current_date}_out_list_records_worker{index}_{yard}.csv"))
+
+
+def run_actor(index, csv_file, transition_queue, weight_queue, stop_event, seed, chunk_size=64, policy_kwargs=None,
+              num_envs=8):
+    """
+    actor 进程：用本地的策略副本在 num_envs 个场地（VectorWarehouseEnvironment）中执行动作，
+    每一步整批选择动作（使用 Q 值时一次前向），把经验按至少 chunk_size 条一批发给 learner。
+    每一步都检查 weight_queue，有新的权重就替换本地策略。策略副本只有在线网络，policy_kwargs 传给 DQNAgent。
+    场地在 step 中抛出异常时由 VectorWarehouseEnvironment 重置该场地，这一步不产生经验，不影响其他场地。
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    agent = DQNAgent(STATE_SIZE, ACTION_SIZE, learner=False, **(policy_kwargs or {}))
+    envs = VectorWarehouseEnvironment([partial(make_worker_env, index, csv_file, yard) for yard in range(num_envs)])
+    chunk = []
+    pending = 0
+    counts = np.full(num_envs, 5)
+    states = envs.get_state().astype(np.float32)
+    while not stop_event.is_set():
+        try:
+            while True:
+                weights, agent.epsilon = weight_queue.get_nowait()
+                agent.model.set_weights(weights)
+        except queue.Empty:
+            pass
+
+        actions = agent.choose_actions(states, counts)
+        next_states, rewards, dones, infos = envs.step(actions)
+        next_states = next_states.astype(np.float32)
+        counts -= 1
+        # 自动重置的场地，经验中的下一状态是重置前的观测，count 重新从 5 开始
+        stored = next_states.copy()
+        valid = np.ones(num_envs, dtype=bool)
+        for yard in np.flatnonzero(dones):
+            info = infos[yard]
+            if 'error' in info:
+                traceback.print_exception(info['error'])
+                valid[yard] = False
+            if 'terminal_observation' in info:
+                stored[yard] = info['terminal_observation']
+                counts[yard] = 5
+        chunk.append((states[valid], actions[valid], rewards[valid], stored[valid], dones[valid]))
+        pending += int(valid.sum())
+        states = next_states
+
+        if pending >= chunk_size:
+            transition_queue.put(tuple(np.concatenate(column).astype(dtype)
+                                       for column, dtype in zip(zip(*chunk), TRANSITION_DTYPES)))
+            chunk = []
+            pending = 0
+    envs.close()
+
+
+def train_parallel(num_workers=None, total_transitions=100000, csv_file='../data_change/segment01-min.csv',
+                   sync_every=100, train_interval=1, seed=0, envs_per_actor=8, **agent_kwargs):
+    """
+    actor/learner 模式的训练。
+
+    num_workers 个 actor 进程各自用 VectorWarehouseEnvironment 运行 envs_per_actor 个场地，
+    通过 transition_queue 把经验发给当前进程中的 learner；learner 写入回放缓冲区，每收到 train_interval 条经验训练一次，
+    每训练 sync_every 次把在线网络的权重和 epsilon 广播给所有 actor。
+    actor 与 learner 使用相同的选择动作方式（use_q_values，默认为 True），广播的权重才会影响 actor 的动作。
+
+    返回训练好的 DQNAgent。
+    """
+    if num_workers is None:
+        num_workers = max(1, (os.cpu_count() or 2) - 1)
+    # TensorFlow 不支持 fork 后继续使用，actor 进程用 spawn 启动
+    context = mp.get_context('spawn')
+    transition_queue = context.Queue(maxsize=4 * num_workers)  # 满了会阻塞 actor，learner 跟不上时自动限速
+    weight_queues = [context.Queue() for _ in range(num_workers)]
+    stop_event = context.Event()
+
+    agent_kwargs.setdefault('use_q_values', True)
+    policy_kwargs = {'use_q_values': agent_kwargs['use_q_values']}
+    agent = DQNAgent(STATE_SIZE, ACTION_SIZE, **agent_kwargs)
+    workers = [context.Process(target=run_actor,
+                               args=(index, csv_file, transition_queue, weight_queues[index], stop_event,
+                                     seed + index),
+                               kwargs={'policy_kwargs': policy_kwargs, 'num_envs': envs_per_actor},
+                               daemon=True)
+               for index in range(num_workers)]
+    for worker in workers:
+        worker.start()
+
+    def broadcast():
+        weights = agent.model.get_weights()
+        for weight_queue in weight_queues:
+            weight_queue.put((weights, agent.epsilon))
+
+    broadcast()
+    received = 0
+    pending = 0
+    try:
+        while received < total_transitions:
+            try:
+                states, actions, rewards, next_states, dones = transition_queue.get(timeout=1.0)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError("All actor processes have exited")
+                continue
+            for i in range(len(actions)):
+                agent.memory.add(states[i], actions[i], rewards[i], next_states[i], dones[i])
+            received += len(actions)
+            pending += len(actions)
+            while pending >= train_interval:
+                pending -= train_interval
+                agent.train()
+                if agent.train_steps and agent.train_steps % sync_every == 0:
+                    broadcast()
+    finally:
+        stop_event.set()
+        for weight_queue in weight_queues:
+            # actor 退出后没有人再读权重，进程退出时不等待队列写完
+            weight_queue.cancel_join_thread()
+        # 清空队列，让阻塞在 put 上的 actor 能够退出
+        for worker in workers:
+            while worker.is_alive():
+                try:
+                    transition_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+                worker.join(timeout=0.1)
+    return agent
+
+
+if __name__ == "__main__":
+    trained_agent = train_parallel()
+    print(f"Trained {trained_agent.train_steps} steps, epsilon {trained_agent.epsilon}")
@@ -0,0 +1,100 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from functools import partial
+
+import numpy as np
+
+from env.exit_journal import ExitJournal
+from env.step_log import StepLogWriter
+from env.tracing import Tracer
+from env.vector_env import VectorWarehouseEnvironment
+from training_env import make_env
+
+
+def make_bench_env(csv_file, log_dir, name):
+    return make_env(csv_file, tracer=Tracer.quiet(),
+                    step_log=StepLogWriter(os.path.join(log_dir, f"{name}_simulation_records.csv")),
+                    exit_journal=ExitJournal(os.path.join(log_dir, f"{name}_out_list_records.csv")))
+
+
+def bench_actions(observations, explore, random_actions):
+    """
+    沿距离较大的方向朝目标移动（与 DQNAgent.choose_action 的贪心规则相同），explore 为 True 的场地用随机动作
+    """
+    distance_x = observations[:, 2] - observations[:, 0]
+    distance_y = observations[:, 3] - observations[:, 1]
+    greedy = np.where(np.abs(distance_x) > np.abs(distance_y),
+                      np.where(distance_x > 0, 3, 2), np.where(distance_y > 0, 1, 0))
+    return np.where(explore, random_actions, greedy)
+
+
+def run_serial(env_fns, explore, random_actions):
+    """
+    逐个场地调用 WarehouseEnvironment.step，与 VectorWarehouseEnvironment 相同地处理 done 和异常，返回耗时（秒）
+    """
+    envs = [env_fn() for env_fn in env_fns]
+    for env in envs:
+        env.save_initial_state()
+    observations = np.array([(env.agent.x, env.agent.y) + env.target_position for env in envs], dtype=float)
+    started = time.perf_counter()
+    for step in range(len(explore)):
+        actions = bench_actions(observations, explore[step], random_actions[step])
+        for index, env in enumerate(envs):
+            try:
+                _, _, done, _ = env.step(int(actions[index]))
+            except Exception:
+                env.reset()
+                continue
+            if done and not env.items and not env.cache_items:
+                env.reset()
+            observations[index] = (env.agent.x, env.agent.y) + env.target_position
+    elapsed = time.perf_counter() - started
+    for env in envs:
+        env.close()
+    return elapsed
+
+
+def run_vector(env_fns, explore, random_actions):
+    """
+    用 VectorWarehouseEnvironment 整批推进，返回耗时（秒）
+    """
+    envs = VectorWarehouseEnvironment(env_fns)
+    observations = envs.get_state()
+    started = time.perf_counter()
+    for step in range(len(explore)):
+        observations, _, _, _ = envs.step(bench_actions(observations, explore[step], random_actions[step]))
+    elapsed = time.perf_counter() - started
+    envs.close()
+    return elapsed
+
+
+def benchmark(num_envs=64, steps=1000, epsilon=0.1, csv_file='../data_change/segment01-min.csv', repeat=3,
+              seed=0):
+    """
+    同样的动作序列分别逐个场地和整批执行 repeat 次，返回 (逐个场地, 整批) 每个场地每步的最短耗时（微秒）。
+    冲突处理方式是随机选择的，两种方式每次都从同一个随机种子开始，得到的轨迹完全相同
+    """
+    rng = np.random.default_rng(seed)
+    explore = rng.random((steps, num_envs)) < epsilon
+    random_actions = rng.integers(0, 4, (steps, num_envs))
+    serial, vector = [], []
+    with tempfile.TemporaryDirectory() as log_dir:
+        for run in range(repeat):
+            for runner, timings, kind in ((run_serial, serial, 'serial'), (run_vector, vector, 'vector')):
+                env_fns = [partial(make_bench_env, csv_file, log_dir, f"{kind}{run}_{index}")
+                           for index in range(num_envs)]
+                random.seed(seed)
+                timings.append(runner(env_fns, explore, random_actions))
+    scale = 1e6 / (steps * num_envs)
+    return min(serial) * scale, min(vector) * scale
+
+
+if __name__ == "__main__":
+    # python benchmark_vector_env.py [场地个数 ...]，在 agent 目录下运行
+    for num_envs in [int(arg) for arg in sys.argv[1:]] or [1, 8, 64, 256]:
+        serial_us, vector_us = benchmark(num_envs)
+        print(f"{num_envs:4d} envs: serial {serial_us:6.1f} us/env-step, "
+              f"vector {vector_us:6.1f} us/env-step, speedup {serial_us / vector_us:.2f}x")
@@ -0,0 +1,97 @@
+import glob
+import os
+import pickle
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def capture(agent, env, episode):
+    """
+    在训练循环中同步取出检查点的内容：agent 和场地的状态副本以及随机数状态。
+    返回的对象与训练中的对象不共享可变数据，之后可以在后台线程中慢慢写盘。
+    """
+    return {
+        'episode': episode,
+        'agent': agent.state_dict(),
+        'env': env.state_dict(),
+        'random_state': random.getstate(),
+        'numpy_random_state': np.random.get_state(),
+    }
+
+
+def restore(agent, env, checkpoint):
+    """
+    用检查点恢复 agent 和场地，返回检查点所在的 episode
+    """
+    agent.load_state_dict(checkpoint['agent'])
+    env.load_state_dict(checkpoint['env'])
+    random.setstate(checkpoint['random_state'])
+    np.random.set_state(checkpoint['numpy_random_state'])
+    return checkpoint['episode']
+
+
+def load_checkpoint(path):
+    with open(path, mode='rb') as file:
+        return pickle.load(file)
+
+
+class Checkpointer:
+    """
+    定期保存训练检查点。
+
+    save 只在当前线程中复制状态，序列化和写盘交给一个后台线程，训练循环不需要等待磁盘；
+    文件先写到 .tmp 再原子地改名，崩溃时不会留下写了一半的检查点。只保留最近 keep 个检查点。
+    同一时间只有一次写盘：save 先等上一次写完，上一次写盘失败时在训练线程中抛出它的异常。
+    """
+
+    def __init__(self, directory='checkpoints', keep=3):
+        if keep < 1:
+            raise ValueError(f"keep must be at least 1, got {keep}")
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = None
+
+    def _path(self, episode):
+        return os.path.join(self.directory, f"checkpoint_{episode:06d}.pkl")
+
+    def save(self, agent, env, episode):
+        checkpoint = capture(agent, env, episode)
+        self.wait()
+        self._pending = self._executor.submit(self._write, checkpoint, episode)
+
+    def _write(self, checkpoint, episode):
+        path = self._path(episode)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, mode='wb') as file:
+            pickle.dump(checkpoint, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        for old_path in self.checkpoints()[:-self.keep]:
+            os.remove(old_path)
+
+    def checkpoints(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'checkpoint_*.pkl')))
+
+    def latest(self):
+        """
+        最近一个检查点的路径，没有检查点时返回 None
+        """
+        paths = self.checkpoints()
+        return paths[-1] if paths else None
+
+    def wait(self):
+        """
+        等待正在进行的写盘，写盘失败时抛出它的异常（只抛出一次）
+        """
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            pending.result()
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
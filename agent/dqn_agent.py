@@ -1,29 +1,49 @@
-import csv
 import gc
+import sys
 
 import numpy as np
-import tensorflow
+import tensorflow as tf
 from keras.models import Sequential
 from keras.layers import Dense
 from keras.optimizers import Adam
-from collections import deque
-import random
 
-from env.envv import WarehouseEnvironment
+from checkpoint import Checkpointer, load_checkpoint, restore
+from replay_buffer import MemmapReplayBuffer, ReplayBuffer
+from training_env import ACTION_SIZE, STATE_SIZE, make_env, state_array
 
 
 class DQNAgent:
-    def __init__(self, state_size, action_size):
+    def __init__(self, state_size, action_size, target_update_every=100, use_q_values=False, memory_size=2000,
+                 prioritized=False, replay_dir=None, learner=True):
         self.state_size = state_size
         self.action_size = action_size
-        self.memory = deque(maxlen=2000)
+        # learner=False 的 agent 只用来选择动作（例如 actor 进程中的策略副本），不分配回放缓冲区和目标网络
+        self.memory = None
+        if learner and replay_dir is not None:
+            # 经验保存在磁盘上的 memmap 段文件中，重启后打开同一个目录即可继续使用
+            if prioritized:
+                raise ValueError("Prioritized replay is not supported with replay_dir")
+            self.memory = MemmapReplayBuffer(replay_dir, state_size)
+        elif learner:
+            self.memory = ReplayBuffer(memory_size, state_size, prioritized=prioritized)
         self.gamma = 0.95  # 折扣因子
         self.epsilon = 1.0  # 探索率
         self.epsilon_decay = 0.995
         self.epsilon_min = 0.01
         self.learning_rate = 0.001
         self.model = self.build_model()
-        tensorflow.keras.utils.disable_interactive_logging()
+        # 目标网络：计算自举目标值，每 target_update_every 次训练与在线网络同步一次
+        self.target_model = None
+        self.target_update_every = target_update_every
+        self.train_steps = 0
+        if learner:
+            self.target_model = self.build_model()
+            self.update_target_model()
+        # 编译好的推理函数，固定输入形状避免重复追踪，单个状态也不经过 model.predict
+        self.predict_fn = tf.function(lambda states: self.model(states, training=False),
+                                      input_signature=[tf.TensorSpec(shape=(None, state_size), dtype=tf.float32)])
+        self.use_q_values = use_q_values  # 为 True 时 choose_action 用 Q 值在两个方向之间选择
+        tf.keras.utils.disable_interactive_logging()
 
     def build_model(self):
         model = Sequential()
@@ -33,31 +53,14 @@ class DQNAgent:
         model.compile(loss='mse', optimizer=Adam(learning_rate=self.learning_rate))
         return model
 
-    # def choose_action(self, state, agent_position, target_position, count):
-    #     if np.random.rand() <= self.epsilon:
-    #         return np.random.choice(self.action_size)
-    #
-    #     # 计算机器人当前位置和目标位置之间的水平和垂直距离
-    #     distance_x = target_position[0] - agent_position[0]
-    #     distance_y = target_position[1] - agent_position[1]
-    #
-    #     # 获取当前Q值
-    #     q_values = self.model.predict(state)[0]
-    #     print("Q值：", q_values)
-    #
-    #     # 根据距离选择行动
-    #     if abs(distance_x) > abs(distance_y):
-    #         # 在水平方向上的距离较大，选择左移或右移
-    #         if distance_x > 0:
-    #             return 3 if q_values[3] > q_values[2] else 2  # 右移或左移
-    #         else:
-    #             return 2 if q_values[2] > q_values[3] else 3  # 左移或右移
-    #     else:
-    #         # 在垂直方向上的距离较大，选择上移或下移
-    #         if distance_y > 0:
-    #             return 1 if q_values[1] > q_values[0] else 0  # 下移或上移
-    #         else:
-    #             return 0 if q_values[0] > q_values[1] else 1  # 上移或下移
+    def update_target_model(self):
+        self.target_model.set_weights(self.model.get_weights())
+
+    def q_values(self, states):
+        """
+        在线网络的 Q 值，states 为 (n, state_size) 的数组，返回 (n, action_size) 的数组
+        """
+        return self.predict_fn(np.asarray(states, dtype=np.float32)).numpy()
 
     def choose_action(self, state, agent_position, target_position, count):
         if np.random.rand() <= self.epsilon and count > 0:
@@ -66,6 +69,19 @@ class DQNAgent:
         distance_x = target_position[0] - agent_position[0]
         distance_y = target_position[1] - agent_position[1]
         # 获取当前Q值
+        if self.use_q_values:
+            q_values = self.q_values(state)[0]
+            # 根据距离确定方向，再用 Q 值在同一方向的两个动作之间选择
+            if abs(distance_x) > abs(distance_y):
+                if distance_x > 0:
+                    return 3 if q_values[3] > q_values[2] else 2  # 右移或左移
+                else:
+                    return 2 if q_values[2] > q_values[3] else 3  # 左移或右移
+            else:
+                if distance_y > 0:
+                    return 1 if q_values[1] > q_values[0] else 0  # 下移或上移
+                else:
+                    return 0 if q_values[0] > q_values[1] else 1  # 上移或下移
         # 根据距离选择行动
         if abs(distance_x) > abs(distance_y):
             # 在水平方向上的距离较大，选择左移或右移
@@ -81,79 +97,118 @@ class DQNAgent:
             else:
                 return 0  # 上移
 
+    def choose_actions(self, states, counts):
+        """
+        choose_action 的批量版本，用于 VectorWarehouseEnvironment：states 为 (n, state_size) 的数组，
+        counts 为每个场地的 count。选择规则与 choose_action 相同，使用 Q 值时整批只做一次前向。
+        """
+        states = np.asarray(states, dtype=np.float32)
+        distance_x = states[:, 2] - states[:, 0]
+        distance_y = states[:, 3] - states[:, 1]
+        # 沿距离较大的方向朝目标移动；同一方向上的另一个动作是 toward ^ 1（0 与 1、2 与 3 互为反方向）
+        toward = np.where(np.abs(distance_x) > np.abs(distance_y),
+                          np.where(distance_x > 0, 3, 2), np.where(distance_y > 0, 1, 0))
+        actions = toward
+        if self.use_q_values:
+            q_values = self.q_values(states)
+            rows = np.arange(len(states))
+            actions = np.where(q_values[rows, toward] > q_values[rows, toward ^ 1], toward, toward ^ 1)
+        explore = (np.random.rand(len(states)) <= self.epsilon) & (np.asarray(counts) > 0)
+        return np.where(explore, np.random.randint(self.action_size, size=len(states)), actions)
+
+    def optimizer_variables(self):
+        variables = self.model.optimizer.variables
+        # Keras 3 中 variables 是属性，tf.keras 2.x 中是方法
+        return variables() if callable(variables) else variables
+
+    def state_dict(self):
+        """
+        训练状态：在线网络和目标网络的权重、优化器状态、回放缓冲区、epsilon 和训练步数
+        """
+        return {
+            'weights': self.model.get_weights(),
+            'target_weights': self.target_model.get_weights(),
+            'optimizer': [variable.numpy() for variable in self.optimizer_variables()],
+            'memory': self.memory.state_dict(),
+            'epsilon': self.epsilon,
+            'train_steps': self.train_steps,
+        }
+
+    def load_state_dict(self, state):
+        self.model.set_weights(state['weights'])
+        self.target_model.set_weights(state['target_weights'])
+        if state['optimizer']:
+            # 优化器的变量在第一次更新时才创建，恢复前先按模型参数建好
+            if len(self.optimizer_variables()) != len(state['optimizer']):
+                self.model.optimizer.build(self.model.trainable_variables)
+            for variable, value in zip(self.optimizer_variables(), state['optimizer']):
+                variable.assign(value)
+        self.memory.load_state_dict(state['memory'])
+        self.epsilon = state['epsilon']
+        self.train_steps = state['train_steps']
+
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.add(state, action, reward, next_state, done)
+
+    @tf.function
+    def train_step(self, states, actions, rewards, next_states, dones, weights):
+        """
+        一个批次的 DQN 更新，编译成图执行。
+
+        目标值与原来逐个样本 fit 时相同：只替换所选动作的 Q 值，其余动作保持当前预测，损失为 mse；
+        下一状态的 Q 值由目标网络给出。优先回放时每个样本的损失乘以重要性采样权重。
+
+        返回：
+        - 每个样本的 TD 误差，用于更新优先级
+        """
+        next_q_values = self.target_model(next_states, training=False)
+        targets = rewards + self.gamma * tf.reduce_max(next_q_values, axis=1) * (1.0 - dones)
+        action_mask = tf.one_hot(actions, self.action_size, dtype=tf.bool)
+        with tf.GradientTape() as tape:
+            q_values = self.model(states, training=True)
+            target_f = tf.where(action_mask, targets[:, None], tf.stop_gradient(q_values))
+            loss = tf.reduce_mean(weights * tf.reduce_mean(tf.square(target_f - q_values), axis=1))
+        gradients = tape.gradient(loss, self.model.trainable_variables)
+        self.model.optimizer.apply_gradients(zip(gradients, self.model.trainable_variables))
+        return targets - tf.reduce_sum(tf.where(action_mask, q_values, 0.0), axis=1)
 
     def train(self, batch_size=32):
-        import tensorflow as tf
-
         if len(self.memory) < batch_size:
             return
-        batch = random.sample(self.memory, batch_size)
-        for state, action, reward, next_state, done in batch:
-            target = reward
-            if not done:
-                target = (reward + self.gamma * np.amax(self.model.predict(next_state)[0]))
-            target_f = self.model.predict(state)
-            target_f[0][action] = target
-            self.model.fit(state, target_f, epochs=1, verbose=0)
-
-            # 清理会话
-            tf.keras.backend.clear_session()
-
-            # 强制垃圾回收
-            # gc.collect()
+        # 回放缓冲区直接给出批次数组，一次前向、一次梯度更新
+        states, actions, rewards, next_states, dones, indices, weights = self.memory.sample(batch_size)
+        # 回放缓冲区中每条经验都是一行，批次的第一维必须与 rewards、actions 一致
+        assert states.shape == next_states.shape == (batch_size, self.state_size), states.shape
+        assert actions.shape == rewards.shape == dones.shape == (batch_size,), actions.shape
+        td_errors = self.train_step(states, actions, rewards, next_states, dones, weights)
+        self.memory.update_priorities(indices, td_errors.numpy())
+        self.train_steps += 1
+        if self.train_steps % self.target_update_every == 0:
+            self.update_target_model()
+
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
 
-def add_items_from_csv(env, csv_file):
-    with open(csv_file, 'r') as file:
-        csv_reader = csv.reader(file)
-        next(csv_reader)  # 跳过 CSV 文件的标题行
-
-        for row in csv_reader:
-            item_id = row[0]
-            x = int(row[1])
-            y = int(row[2])
-            length = int(row[3])
-            width = int(row[4])
-            start_time = str(row[6])
-            exit_time = str(row[7])
-            processing_time = 5
-            if row[12] == '':
-                time_remian = 0
-            else:
-                time_remian = int(row[12])
-
-            # 添加物品到环境
-            env.check_item(item_id, x, y, length, width, start_time, processing_time, exit_time, time_remian)
-
-
-def main():
-    env = WarehouseEnvironment(width=250, height=200, number=90, time='2024/4/26')
-    env.setRoads('right')
-    env.initialize_segment(92, 58, 70, 20, 16, 12)
-
-    add_items_from_csv(env, '../data_change/segment01-min.csv')
+def main(resume=False, checkpoint_dir='checkpoints', checkpoint_every=1):
+    """
+    训练入口。每 checkpoint_every 个 episode 在后台写一次检查点；
+    resume=True 时从 checkpoint_dir 中最近的检查点继续训练。
+    """
+    env = make_env()
     env.render()
-    state_size = len(env.get_state())
-    action_size = 4  # 代表上移、下移和不执行动作
-    agent = DQNAgent(state_size, action_size)
+    agent = DQNAgent(STATE_SIZE, ACTION_SIZE)
 
     episodes = 100
-
-    for episode in range(episodes):
-        state = env.get_state()  # Get the initial state
-        agent_position = np.array(list(state['agent_position']))
-        target_position = np.array(list(state['target_positions']))
-        # item_positions = np.array(list(state['item_positions']))
-
-        # 将这些位置信息合并成一个数组
-        state_array = np.concatenate([agent_position, target_position])
-        #  print(state_array)
-        state = np.reshape(state_array, [-1, state_size])
-        # print(state)
+    checkpointer = Checkpointer(checkpoint_dir)
+    start_episode = 0
+    if resume and checkpointer.latest() is not None:
+        start_episode = restore(agent, env, load_checkpoint(checkpointer.latest())) + 1
+        print(f"Resumed from episode {start_episode}")
+
+    for episode in range(start_episode, episodes):
+        # 状态是 [agent_x, agent_y, target_x, target_y] 的一行
+        agent_position, target_position, state = state_array(env.get_state())
         total_reward = 0
         done = False
         count = 5
@@ -161,13 +216,7 @@ def main():
             action = agent.choose_action(state, agent_position, target_position, count)
             next_state, reward, done, _ = env.step(action)
             print(next_state)
-            agent_position = np.array(list(next_state['agent_position']))
-            target_position = np.array(list(next_state['target_positions']))
-            # item_positions = np.array(list(state['item_positions']))
-
-            # 将这些位置信息合并成一个数组
-            next_state_array = np.concatenate([agent_position, target_position])
-            next_state = np.reshape(next_state_array, [-1, state_size])
+            agent_position, target_position, next_state = state_array(next_state)
 
             agent.remember(state, action, reward, next_state, done)
             agent.train()
@@ -179,7 +228,16 @@ def main():
             #     total_reward = 10000
             #     break
         print(f"Episode: {episode + 1}, Total Reward: {total_reward}")
+        if (episode + 1) % checkpoint_every == 0:
+            checkpointer.save(agent, env, episode)
+
+    checkpointer.close()
+    env.close()
+
+
+def resume(checkpoint_dir='checkpoints'):
+    main(resume=True, checkpoint_dir=checkpoint_dir)
 
 
 if __name__ == "__main__":
-    main()
+    main(resume='--resume' in sys.argv)
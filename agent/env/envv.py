@@ -1,5 +1,6 @@
 import copy
-import csv
+import heapq
+import operator
 import time
 from random import choice
 
@@ -7,7 +8,19 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from env.event_clock import ARRIVAL, EXIT, TRANSPORT, EventClock
+from env.exit_journal import ExitJournal
+from env.log_files import unclaimed_path
+from env.occupancy import OccupancyGrid
+from env.renderer import FrameWriter, SceneRenderer
+from env.retrieval_queue import RetrievalQueue
+from env.segment_store import SegmentStore
+from env.sim_time import format_date, parse_time
+from env.spatial_index import RowIndex
+from env.step_log import StepLogWriter
+from env.tracing import DEBUG, INFO, WARNING, StdoutSink, Tracer
 
 
 class ItemPickupError(Exception):
@@ -16,13 +29,16 @@ class ItemPickupError(Exception):
 
 
 class Item:
+    __slots__ = ('item_id', 'length', 'width', 'start_time', 'processing_time', 'exit_time', 'x', 'y',
+                 'time_remain', 'color')
+
     def __init__(self, item_id, x, y, length, width, start_time, processing_time, exit_time, time_remain, color):
         self.item_id = item_id
         self.length = length  # 分段长
         self.width = width  # 分段宽
-        self.start_time = start_time  # 最早开工时间
+        self.start_time = start_time  # 最早开工时间（仿真时钟的整数秒）
         self.processing_time = processing_time  # 加工周期
-        self.exit_time = exit_time  # 最早出场时间
+        self.exit_time = exit_time  # 最早出场时间（仿真时钟的整数秒）
         self.x = x  # 物品的 x 坐标
         self.y = y  # 物品的 y 坐标
         self.time_remain = time_remain  # 时间余量
@@ -30,8 +46,8 @@ class Item:
 
     def __str__(self):
         return f"Item ID: {self.item_id}, Size: ({self.length}m x {self.width}m), Bound:({self.x + self.width},{self.y + self.length})" \
-               f"Start Time: {self.start_time}, Processing Time: {self.processing_time} days, " \
-               f"Exit Time: {self.exit_time}"
+               f"Start Time: {format_date(self.start_time)}, Processing Time: {self.processing_time} days, " \
+               f"Exit Time: {format_date(self.exit_time)}"
 
     # 可以根据需要添加其他方法，例如移动物品或检查物品与其他物品的冲突
     def get_rectangle(self):
@@ -48,14 +64,25 @@ class Item:
         return left, top, right, bottom
 
 
+INIT_TIME = parse_time('2017/9/1')  # 占位物品使用的时间
+
+
+ITEM_FIELDS = operator.attrgetter(*Item.__slots__)  # 一次取出 Item 的全部字段，用于快照
+
+
 class WarehouseEnvironment:
-    def __init__(self, width, height, number, time='2017/9/1'):
+    def __init__(self, width, height, number, time='2017/9/1', tracer=None, step_log=None, exit_journal=None):
+        time = parse_time(time)
+        # 结构化跟踪，默认把 INFO 及以上的事件输出到标准输出；批量训练时传入 Tracer.quiet()
+        self.tracer = tracer if tracer is not None else Tracer(level=INFO, sinks=[StdoutSink()])
         self.width = width
         self.height = height
         self.number = number
         self.bias = 0
         self.segment_heights = []  # 存储已添加物品的分段高度
         self.y_positions = []
+        self.row_of_height = {}  # 分段高度 -> 在 segment_heights 中的下标
+        self.layout_dirty = True  # 行的集合变化后才需要重新计算 segment_heights 和 y_positions
 
         self.seg_high = 0  # [seg_mid,seg_high]
         self.seg_mid = 0  # [seg_low,seg_mid]
@@ -68,10 +95,13 @@ class WarehouseEnvironment:
         self.segment_mid = []
         self.segment_low = []
 
-        self.grid = np.zeros((height, width), dtype=object)
+        self.grid = OccupancyGrid(width, height)  # 整数占据栅格，与 items 同步增删，setRoads 时标出道路
         self.agent = Item('agent', 0, 0, 5, 5, time, 0, time, 0, 'black')
 
         self.items = {}
+        self.row_index = RowIndex()  # items 的按行索引，与 items 同步增删
+        self._conflict_removed = None  # conflict_resolve 处理冲突期间移出场地的 (登记顺序, 物品)
+        self.retrieval_queue = RetrievalQueue()  # 按抽取顺序排列的物品堆，与 items 同步增删
         self.colors = list(mcolors.TABLEAU_COLORS)
         # self.road = {'x': width, 'width': 20, 'color': 'lightgray'}  # 道路属性
         self.roads = []
@@ -86,7 +116,9 @@ class WarehouseEnvironment:
         self.tag_bottom = False
         self.tag_top = False
 
-        self.current_time = datetime.strptime(time, '%Y/%m/%d')  # 最早出场时间
+        self.clock = EventClock(time)  # 离散事件时钟，current_time 就是 clock.now
+        self.step_seconds = 30  # 每一步动作消耗的仿真时间（秒）
+        self.seconds_per_unit = 3  # 宏动作中每移动一个单位消耗的仿真时间（秒），与逐步移动时每步最多 10 个单位一致
         self.agent_has_item = False
         self.total_reward = 0
         self.total_step_time = 0
@@ -94,16 +126,35 @@ class WarehouseEnvironment:
         self.task_positions = []
         self.conflict_count = 0
         self.out_list = []
+        # 出场记录只追加到日志中，不再每次重写整个文件
+        # 与步骤记录相同，同一进程中的多个场地各自写自己的出场记录
+        if exit_journal is None:
+            exit_journal = ExitJournal(unclaimed_path(f"{datetime.now().strftime('%Y-%m-%d')}_out_list_records",
+                                                      '.csv'))
+        self.exit_journal = exit_journal
         self.item_random = None
         self.initial_state = {
             'agent_has_item': self.agent_has_item,
             'agent_position': (self.agent.x, self.agent.y),
             'target_positions': self.target_position,
         }
-        self.cache_items = []
-        self.step_records = []
+        self.cache_items = []  # 尚未到达的物品，按到达时间排列的最小堆 [(start_time, 登记顺序, segment_store 中的视图)]
+        self.cache_counter = 0
+        self.segment_store = SegmentStore()
+        # 步骤记录流式追加到文件，不在内存中保留；可传入 StepLogWriter(path, fmt='binary') 使用二进制格式
+        # 默认文件名按日期命名，同一进程中的多个场地依次加上 _1、_2 后缀，不会写进同一个文件
+        if step_log is None:
+            step_log = StepLogWriter(unclaimed_path(f"{datetime.now().strftime('%Y-%m-%d')}_simulation_records",
+                                                    '.csv'))
+        self.step_log = step_log
         self.interfering_items = []
-        self.start_time = datetime.now()
+        self.initial_snapshot = None  # reset() 恢复到的状态，第一次 step 之前自动保存
+        # 决策策略：为 None 时冲突处理方式随机选择、抽取顺序按 retrieval_queue；
+        # 规划器可以设置为带 choose_conflict / choose_retrieval 方法的对象来接管这两类决策
+        self.decision_policy = None
+        self.retrieval_options = 3  # 交给 decision_policy 选择的到期物品个数上限
+        self.renderer = None  # 第一次 render 时创建，之后一直复用同一个 figure
+        self.frame_writer = None  # record_frames 打开后每次 render 写一帧
 
     def change_bias(self):
         self.bias = 20
@@ -129,7 +180,6 @@ class WarehouseEnvironment:
 
         if valid_roads:
             min_distance_road = min(valid_roads, key=lambda road: distances[road])
-            print(f"Choosing road: {min_distance_road}")
             if min_distance_road == 'distance_x_left':
                 self.task_positions.append((0, self.agent.y))
 
@@ -143,9 +193,11 @@ class WarehouseEnvironment:
                 self.task_positions.append((self.agent.x, self.height - self.agent.length))
 
         else:
-            print("No valid roads found.")
+            self.trace(WARNING, 'road', road=None)
+            return
 
-        print("Task positions:", self.task_positions)
+        if self.tracer.level <= DEBUG:
+            self.trace(DEBUG, 'road', road=min_distance_road, task_positions=list(self.task_positions))
 
     def setRoads(self, *names):
         roads = [{'name': 'right', 'width': 20, 'color': 'lightgray'},
@@ -153,6 +205,7 @@ class WarehouseEnvironment:
                  {'name': 'top', 'height': 20, 'color': 'lightpink'},
                  {'name': 'bottom', 'height': 20, 'color': 'lightyellow'}]  # 道路属性
 
+        self.layout_dirty = True
         for name in names:
             if name == 'right':
                 self.roads.append(roads[0])
@@ -166,14 +219,54 @@ class WarehouseEnvironment:
             if name == 'bottom':
                 self.roads.append(roads[3])
                 self.tag_bottom = True
+        self.grid.set_roads(self.roads)
+
+    @property
+    def current_time(self):
+        """
+        当前仿真时间（整数秒），与物品的 start_time、exit_time 直接比较
+        """
+        return self.clock.now
+
+    @current_time.setter
+    def current_time(self, value):
+        self.clock.reset(value)
 
     def simulate_time_passage(self):
-        # 判断是否过了1秒，如果是，增加一分钟
-        start_time = self.start_time.second
-        end_time = datetime.now().second
-        hours = abs(int(end_time - start_time))
-        self.current_time += timedelta(minutes=hours * 0.5)
-        print(self.current_time)
+        # 每一步固定消耗 step_seconds 的仿真时间，与主机运行快慢无关
+        self.clock.advance(self.step_seconds)
+        self.trace(DEBUG, 'clock')
+
+    def next_event(self):
+        """
+        下一个会改变场地状态的事件：缓存物品到达、物品到达出场时间、时钟中登记的搬运完成。
+
+        返回：
+        - (time, kind)，没有未来事件时返回 None
+        """
+        events = []
+        if self.cache_items:
+            events.append((self.cache_items[0][0], ARRIVAL))
+        earliest_item = self.retrieval_queue.peek()
+        if earliest_item is not None:
+            events.append((earliest_item.exit_time, EXIT))
+        if self.clock.next_time() is not None:
+            events.append((self.clock.next_time(), self.clock.next_kind()))
+        events = [event for event in events if event[0] > self.current_time]
+        if not events:
+            return None
+        return min(events)
+
+    def advance_to_next_event(self):
+        """
+        空闲时让时钟直接跳到下一个事件，返回跳到的时间，没有事件时返回 None
+        """
+        event = self.next_event()
+        if event is None:
+            return None
+        self.clock.jump_to(event[0])
+        self.trace(INFO, 'jump', event=event[1])
+        return event[0]
 
     def get_state(self):
         agent_position = (self.agent.x, self.agent.y)  # 代理机器人的位置
@@ -221,27 +314,21 @@ class WarehouseEnvironment:
 
     def has_cache_item(self):
         if len(self.cache_items) > 0:
-            print("len : " + str(len(self.cache_items)))
-
-            # 使用原始列表的副本进行迭代
-            for item in self.cache_items.copy():
-                # 在原始列表上进行删除操作
-                self.cache_items.remove(item)
-                self.check_item(item.item_id, item.x, item.y, item.length, item.width, item.start_time,
-                                item.processing_time, item.exit_time, item.time_remain)
+            # 只取出已经到达的物品，堆顶还没到达时什么都不用做
+            if self.cache_items[0][0] <= self.current_time:
+                self.trace(DEBUG, 'cache', size=len(self.cache_items))
+            while self.cache_items and self.cache_items[0][0] <= self.current_time:
+                _, _, item = heapq.heappop(self.cache_items)
+                args = (item.item_id, item.x, item.y, item.length, item.width, item.start_time,
+                        item.processing_time, item.exit_time, item.time_remain)
+                self.segment_store.free(item.row)
+                self.check_item(*args)
         else:
-            print("列表为空。")
+            self.trace(DEBUG, 'cache', size=0)
 
     def record_step(self, action, done):
-        step_info = {
-            'action': action,
-            'agent_position': (self.agent.x, self.agent.y),
-            'target_position': self.target_position,
-            'total_reward': self.total_reward,
-            'elapsed_time': self.total_step_time,
-            'conflict_count': self.conflict_count,
-        }
-        self.step_records.append(step_info)
+        self.step_log.append(self.clock.now, action, (self.agent.x, self.agent.y), self.target_position,
+                             self.total_reward, self.total_step_time, self.conflict_count)
         if done:
             self.save_records_to_csv()
             self.total_step_time = 0
@@ -268,46 +355,44 @@ class WarehouseEnvironment:
 
             # time.sleep(0.001 * move_x_distance)
         else:
-            print("Invalid action!")
+            self.trace(WARNING, 'invalid_action', action=action)
 
     def get_earliest_item(self):
         if len(self.items) > 0 and self.target_position == (0, 0):
-            # 获取最早出场时间的物品
-            sorted_items = sorted(list(self.items.values()), key=lambda x: datetime.strptime(x.exit_time, "%Y/%m/%d"))
-            min_date = sorted_items[0].exit_time
-            filtered_items = list(filter(lambda x: x.exit_time == min_date, sorted_items))
-
-            sorted_items = sorted(filtered_items, key=lambda x: x.time_remain)
-
-            min_time_remain = sorted_items[0].time_remain
-            sorted_items_remain = list(filter(lambda x: x.time_remain == min_time_remain, sorted_items))
-
-            print("sorted_items: ")
-            for item in sorted_items_remain:
-                print(item.item_id, item.exit_time)
-            earliest_item = min(sorted_items_remain, key=lambda x: x.x)
-
-            print("earliest_item: ", earliest_item.item_id, earliest_item.exit_time)
-            print("current_time: ", self.current_time)
-            if datetime.strptime(earliest_item.exit_time, "%Y/%m/%d") <= self.current_time:
+            # 获取最早出场时间的物品：出场时间最早、时间余量最小、x 最小
+            earliest_item = self.retrieval_queue.peek()
+            if self.decision_policy is not None and earliest_item.exit_time <= self.current_time:
+                candidates = [item for item in self.retrieval_queue.smallest(self.retrieval_options)
+                              if item.exit_time <= self.current_time]
+                if len(candidates) > 1:
+                    earliest_item = self.decision_policy.choose_retrieval(self, candidates)
+
+            if self.tracer.level <= DEBUG:
+                self.trace(DEBUG, 'earliest', item_id=earliest_item.item_id,
+                           exit_time=format_date(earliest_item.exit_time))
+            if earliest_item.exit_time <= self.current_time:
                 # 设置抽取的物品
                 self.item = earliest_item
                 # 获取目标位置
                 self.task_positions.append((self.item.x, self.item.y))
                 self.target_position = self.task_positions.pop(-1)
             else:
-                # self.set_current_time(datetime.strptime(earliest_item.exit_time, "%Y/%m/%d"))
-                pass
+                # 没有到期的物品，时钟直接跳到下一个事件，不再逐步空转
+                self.advance_to_next_event()
+        elif self.target_position == (0, 0):
+            # 场地中没有物品，时钟直接跳到下一批物品到达的时间
+            self.advance_to_next_event()
 
     def set_current_time(self, new_time):
-        self.current_time = new_time
+        """
+        任务结束时把时钟重设到最早出场物品的出场时间，这是时钟唯一可能倒退的地方（EventClock.reset）
+        """
+        self.clock.reset(parse_time(new_time))
 
     def add_interfering_item(self):
         if self.arrive_interfering_position():
             item = self.interfering_items.pop(-1)
-            print("干扰物品的是：", item.item_id)
-            print("干扰物品的位置：", item.x, item.y)
-            print("机器人到达要添加物品的位置：", item.x, item.y)
+            self.trace(INFO, 'relocation', item_id=item.item_id, x=item.x, y=item.y)
             self.check_item(item.item_id, 1, item.y, item.length, item.width, item.start_time,
                             item.processing_time,
                             item.exit_time, item.time_remain)
@@ -327,28 +412,56 @@ class WarehouseEnvironment:
     def conflict_resolve(self, reward):
         # 在代理机器人移动过程中检测冲突
 
-        if self.agent_has_item is True:
-            for other_item in list(self.items.values()):
-                if other_item.item_id.strip('agent_') != self.agent.item_id.strip(
-                        'agent_') and self.check_collision(self.agent, other_item):
+        if self.agent_has_item is True and not self.grid.is_free(*self.agent.get_rectangle()):
+            # 占据栅格上是空地时直接跳过。否则按登记顺序（与 items 的顺序相同）逐个处理冲突物品：
+            # 每次在占据栅格上查询 agent 矩形内、排在上一个冲突物品之后的分段。
+            # 处理冲突会移动或替换 agent，所以每处理一个冲突后用新的矩形重新查询；处理过程中新放入的物品不再检查
+            agent_id = self.agent.item_id.strip('agent_')
+            until = self.grid.last_order
+            after = 0
+            self._conflict_removed = []
+            try:
+                while True:
+                    other_item, after = self._next_conflict(agent_id, after, until)
+                    if other_item is None:
+                        break
                     # 处理冲突
-                    print(
-                        f"冲突发生：代理机器人携带的物品与其他物品冲突  " + other_item.item_id.strip(
-                            'agent_') + "     " +
-                        self.agent.item_id.strip('agent_'))
                     # 随机选择一种处理方式
                     tag_conflict = self.conflict_count
-                    random_action = choice(
-                        [self.handle_conflict_1, self.handle_conflict_2, self.handle_conflict_3])
-
+                    handlers = [self.handle_conflict_1, self.handle_conflict_2, self.handle_conflict_3]
+                    if self.decision_policy is None:
+                        random_action = choice(handlers)
+                    else:
+                        random_action = self.decision_policy.choose_conflict(self, other_item, handlers)
+
+                    self.trace(INFO, 'conflict', item_id=other_item.item_id, agent=self.agent.item_id,
+                               handler=random_action.__name__)
                     # 执行随机选择的处理方式
                     random_action(other_item)
 
                     # self.handle_conflict_2(other_item)
                     reward -= 25 * (self.conflict_count - tag_conflict)
+                    agent_id = self.agent.item_id.strip('agent_')
+            finally:
+                self._conflict_removed = None
 
         return reward
 
+    def _next_conflict(self, agent_id, after, until):
+        """
+        登记顺序在 (after, until] 之间、与 agent 相交的第一个物品及其登记顺序，没有时返回 (None, until)。
+        处理冲突时被移出场地的物品仍按原来的登记顺序参与判断，与遍历 items 副本的结果一致
+        """
+        hits = self.grid.overlapping(*self.agent.get_rectangle(), after=after, until=until)
+        if self._conflict_removed:
+            hits.extend((order, item) for order, item in self._conflict_removed
+                        if after < order <= until and self.check_collision(self.agent, item))
+            hits.sort(key=lambda hit: hit[0])
+        for order, other_item in hits:
+            if other_item.item_id.strip('agent_') != agent_id:
+                return other_item, order
+        return None, until
+
     def add_blocked_item(self):
         try:
             if self.arrive_interfering_position():
@@ -369,10 +482,11 @@ class WarehouseEnvironment:
                 else:
                     self.target_position = self.task_positions.pop(-1)
         except Exception as e:
-            print(f"An error occurred in is_one: {e}")
-            print("任务列表:", self.task_positions)
-            print("self.agent；", self.agent.item_id, self.agent.x, self.agent.y)
-            print("self.item: ", self.item.item_id, self.item.x, self.item.y)
+            # 字段总是先构造，与原来打印时的行为一致
+            self.trace(WARNING, 'error', where='add_blocked_item', error=repr(e),
+                       task_positions=list(self.task_positions),
+                       agent=(self.agent.item_id, self.agent.x, self.agent.y),
+                       item=(self.item.item_id, self.item.x, self.item.y))
             self.task_positions = []  # 清空任务列表
 
     def pick_up_item(self):
@@ -389,32 +503,33 @@ class WarehouseEnvironment:
                 self.agent_has_item = True
                 self.choose_road(self.agent.x, item.y)
                 self.remove_item(item)
+                self.trace(INFO, 'pickup', item_id=item.item_id, x=item.x, y=item.y)
 
         except Exception as e:
-            print(f"An error occurred in pick_up_item: {e}")
-            print("任务列表:", self.task_positions)
-            print("self.agent；", self.agent.item_id, self.agent.x, self.agent.y)
-            print("self.item: ", self.item.item_id, self.item.x, self.item.y)
-            print("item: ", item)
+            # 字段总是先构造，与原来打印时的行为一致
+            self.trace(WARNING, 'error', where='pick_up_item', error=repr(e),
+                       task_positions=list(self.task_positions),
+                       agent=(self.agent.item_id, self.agent.x, self.agent.y),
+                       item=(self.item.item_id, self.item.x, self.item.y))
+
+    def trace(self, level, kind, **fields):
+        """
+        记录一条跟踪事件，时间取仿真时钟。
+        字段构造开销较大的调用方应先判断 self.tracer.level，级别关闭时不构造字段。
+        """
+        if level >= self.tracer.level:
+            self.tracer.emit(level, kind, self.clock.now, fields)
 
     def print_info(self):
-        print("=========================================================================")
-        print("现在的物品有:")
-        for k, v in self.items.items():
-            print(k, v.item_id)
-        if len(self.task_positions) > 0:
-            print('-----------------------------------------------------')
-            print("任务位置的长度是：", len(self.task_positions))
-            print("当前任务位置是：", self.target_position[0], self.target_position[1])
-            print("下一步任务位置是：", self.task_positions[-1][0], self.task_positions[-1][1])
-            print('-----------------------------------------------------')
-        print("现在干涉物品的长度：  " + str(len(self.interfering_items)))
-        for interfering in self.interfering_items:
-            print("干涉物品是：  " + str(interfering.item_id) + "  " + str(interfering.x) + "  " + str(interfering.y))
-        print("代理机器人的状态： ", self.agent.item_id, self.agent.x, self.agent.y)
-        print("是否携带物品：", self.agent_has_item)
-        if self.agent_has_item:
-            print("Agent has item!       " + str(self.agent.item_id))
+        if self.tracer.level > DEBUG:
+            return
+        self.trace(DEBUG, 'state',
+                   items=[(k, v.item_id) for k, v in self.items.items()],
+                   target_position=self.target_position,
+                   task_positions=list(self.task_positions),
+                   interfering_items=[(i.item_id, i.x, i.y) for i in self.interfering_items],
+                   agent=(self.agent.item_id, self.agent.x, self.agent.y),
+                   agent_has_item=self.agent_has_item)
 
     def step(self, action):
         """
@@ -438,9 +553,10 @@ class WarehouseEnvironment:
             reward : 奖励初始化
             
         """
+        if self.initial_snapshot is None:
+            self.save_initial_state()
         self.print_info()
         # 记录每一步的时间
-        done = False
         step_time = datetime.now()
         #  检测是否有缓存的物品需要加入
         self.has_cache_item()
@@ -464,55 +580,153 @@ class WarehouseEnvironment:
         reward = self.conflict_resolve(reward)
 
         # -------------------分割线----------------------
+        if (self.agent.x, self.agent.y) == self.target_position:
+            reward = self.arrive_target(reward)
 
+        # -------------------分割线----------------------
+        """
+            计算下到达目标位置的x,y: 以此来计算奖励值应该为多少   
+        """
+        # 计算奖励
+        if self.target_position != (0, 0) and self.target_position[0] < self.width:
+            x_distance_to_target = abs(self.agent.x - self.target_position[0])
+            y_distance_to_target = abs(self.agent.y - self.target_position[1])
+            # 根据距离计算奖励
+            reward += 100 - x_distance_to_target - y_distance_to_target
+
+        return self.finish_step(action, reward, step_time)
+
+    def arrive_target(self, reward):
         """
             如果 agent 位置 等于 目标位置: 1.到达要 拿取物品 的位置 (加 200 奖励)
                                        2.到达添加 干涉物品 的位置 (加 200 奖励)
                                        3.完成了这一次的搬运 那么记录一下信息，初始化系统的 item agent
                                          设置 agent 为不携带物品，弹出下一个 任务 (加 500 奖励)
         """
-        if (self.agent.x, self.agent.y) == self.target_position:
-            if self.target_position[0] < self.width and self.target_position[
-                1] < self.height and self.agent_has_item == False:
-                self.pick_up_item()
-                self.add_blocked_item()
-                reward += 20  # 到达目标位置的奖励
+        if self.target_position[0] < self.width and self.target_position[
+            1] < self.height and self.agent_has_item == False:
+            self.pick_up_item()
+            self.add_blocked_item()
+            reward += 20  # 到达目标位置的奖励
 
-            if self.agent.x >= self.width or self.agent.x <= 0 \
-                    or self.agent.y <= 0 or self.agent.get_rectangle()[3] >= self.height:
+        if self.agent.x >= self.width or self.agent.x <= 0 \
+                or self.agent.y <= 0 or self.agent.get_rectangle()[3] >= self.height:
 
-                # 记录每一步的信息
-                self.out_list.append(self.item)
-                self.out_listed()
+            # 记录每一步的信息
+            self.trace(INFO, 'delivered', item_id=self.item.item_id)
+            self.out_list.append(self.item)
+            self.out_listed()
 
-                # Todo:为抽取方法
-                self.item = self.getInitItem()
-                tmp_agent_x = self.agent.x
-                tmp_agent_y = self.agent.y
-                self.agent = self.item
-                self.agent.x = tmp_agent_x
-                self.agent.y = tmp_agent_y
+            # Todo:为抽取方法
+            self.item = self.getInitItem()
+            tmp_agent_x = self.agent.x
+            tmp_agent_y = self.agent.y
+            self.agent = self.item
+            self.agent.x = tmp_agent_x
+            self.agent.y = tmp_agent_y
 
-                self.agent_has_item = False
-                reward += 50  # 成功搬运物品的奖励
-                if len(self.interfering_items) == 0 and len(self.task_positions) == 0:
-                    self.task_positions.append((0, 0))
-                elif len(self.task_positions) != 0:
-                    self.target_position = self.task_positions.pop(-1)
-                else:
-                    print("task_positions is null")
+            self.agent_has_item = False
+            reward += 50  # 成功搬运物品的奖励
+            if len(self.interfering_items) == 0 and len(self.task_positions) == 0:
+                self.task_positions.append((0, 0))
+            elif len(self.task_positions) != 0:
+                self.target_position = self.task_positions.pop(-1)
+            else:
+                self.trace(WARNING, 'task_positions_empty')
+        return reward
 
-        # -------------------分割线----------------------
+    def macro_step(self):
         """
-            计算下到达目标位置的x,y: 以此来计算奖励值应该为多少   
+            宏动作：一次调用把 agent 直接移动到当前目标位置，代替逐步的 agent_move + binary_forward。
+            先沿距离较大的方向走，再沿另一个方向走（与 DQNAgent.choose_action 的贪心规则一致）。
+            携带物品时对每一段的扫掠区域做碰撞检测，碰到物品就停在接触位置，交给 conflict_resolve 处理，
+            本次宏动作到此结束。
+
+            返回：
+            - (new_state, reward, done, info)，reward 为本次宏动作的冲突惩罚、到达奖励和最后位置的距离奖励之和，
+              info['elapsed_time'] 为本次消耗的仿真时间（秒），info['distance'] 为 agent 实际移动的距离
         """
-        # 计算奖励
+        if self.initial_snapshot is None:
+            self.save_initial_state()
+        self.print_info()
+        step_time = datetime.now()
+        start_time = self.current_time
+        self.has_cache_item()
+        reward = 0
+        if self.target_position == (0, 0):
+            self.get_earliest_item()
+
+        distance = 0
+        if self.target_position != (0, 0):
+            target_x = min(max(self.target_position[0], 0), self.width)
+            target_y = min(max(self.target_position[1], 0), self.height - self.agent.length)
+            legs = [(target_x, self.agent.y), (target_x, target_y)]
+            if abs(target_y - self.agent.y) > abs(target_x - self.agent.x):
+                legs = [(self.agent.x, target_y), (target_x, target_y)]
+            for end_x, end_y in legs:
+                contact = self.sweep(end_x, end_y)
+                stop_x, stop_y = contact if contact is not None else (end_x, end_y)
+                distance += abs(stop_x - self.agent.x) + abs(stop_y - self.agent.y)
+                self.agent.x, self.agent.y = stop_x, stop_y
+                if contact is not None:
+                    reward = self.conflict_resolve(reward)
+                    break
+
+        # 搬运完成作为一个事件登记到时钟上，时钟直接跳过去
+        elapsed = max(distance * self.seconds_per_unit, self.step_seconds)
+        self.clock.schedule(self.current_time + elapsed, TRANSPORT)
+        self.clock.jump_to(self.current_time + elapsed)
+
+        if (self.agent.x, self.agent.y) == self.target_position:
+            reward = self.arrive_target(reward)
         if self.target_position != (0, 0) and self.target_position[0] < self.width:
-            x_distance_to_target = abs(self.agent.x - self.target_position[0])
-            y_distance_to_target = abs(self.agent.y - self.target_position[1])
-            # 根据距离计算奖励
-            reward += 100 - x_distance_to_target - y_distance_to_target
+            reward += 100 - abs(self.agent.x - self.target_position[0]) - abs(self.agent.y - self.target_position[1])
+
+        new_state, reward, done, info = self.finish_step('macro', reward, step_time, advance_clock=False)
+        info['elapsed_time'] = self.current_time - start_time
+        info['distance'] = distance
+        return new_state, reward, done, info
 
+    def sweep(self, end_x, end_y):
+        """
+        agent 沿水平或垂直方向移动到 (end_x, end_y) 时，检查携带的物品扫过的区域。
+
+        返回：
+        - 第一个接触到的物品所在的停止位置 (x, y)，在该位置 agent 与物品刚好相交；没有碰撞或没有携带物品时返回 None
+        """
+        if not self.agent_has_item or (end_x, end_y) == (self.agent.x, self.agent.y):
+            return None
+        left, top, right, bottom = self.agent.get_rectangle()
+        swept = (min(left, end_x), min(top, end_y),
+                 max(right, end_x + self.agent.width), max(bottom, end_y + self.agent.length))
+        # 扫过的区域直接在占据栅格上查询，空地时是 O(1) 的一次前缀和判断
+        agent_id = self.agent.item_id.strip('agent_')
+        hits = [item for _, item in self.grid.overlapping(*swept) if item.item_id.strip('agent_') != agent_id]
+        # 起点已经相交的物品不算沿途碰撞
+        hits = [item for item in hits if not self.check_collision(self.agent, item)]
+        if not hits:
+            return None
+        if end_x > self.agent.x:
+            item = min(hits, key=lambda other: other.x)
+            return item.x - self.agent.width + 1, self.agent.y
+        if end_x < self.agent.x:
+            item = max(hits, key=lambda other: other.x + other.width)
+            return item.x + item.width - 1, self.agent.y
+        if end_y > self.agent.y:
+            item = min(hits, key=lambda other: other.y)
+            return self.agent.x, item.y - self.agent.length + 1
+        item = max(hits, key=lambda other: other.y + other.length)
+        return self.agent.x, item.y + item.length - 1
+
+    def finish_step(self, action, reward, step_time, advance_clock=True):
+        """
+            一步的收尾：更新 agent 标记，弹出任务，模拟时间，清理道路，判断是否完成并记录
+            advance_clock 为 False 时调用方已经推进过时钟（宏动作）
+
+            返回：
+            - (new_state, reward, done, info)，与 step 的返回值相同
+        """
+        done = False
         # -------------------分割线----------------------
         """
                 如果携带了物品，为了更加醒目，给agent加上携带的物品id   
@@ -540,7 +754,8 @@ class WarehouseEnvironment:
             清理道路上的物品
             更新绘图 
         """
-        self.simulate_time_passage()
+        if advance_clock:
+            self.simulate_time_passage()
         # 更新状态
         new_state = self.get_state()
         self.clean_on_road()
@@ -556,7 +771,7 @@ class WarehouseEnvironment:
         if self.target_position == (0, 0) and len(self.task_positions) == 0 \
                 and len(self.interfering_items) == 0 and (self.agent.x, self.agent.y) != (0, 0):
 
-            print("---------------------------任务完成-------------------------")
+            self.trace(INFO, 'done', out=len(self.out_list))
             done = True
             new_state = self.get_state()
             reward += 250
@@ -572,7 +787,7 @@ class WarehouseEnvironment:
             if not list(self.items.values()):
                 pass
             else:
-                earliest_item = min(list(self.items.values()), key=lambda x: datetime.strptime(x.exit_time, "%Y/%m/%d"))
+                earliest_item = self.retrieval_queue.peek()
                 # # 获取最早出场时间的物品
                 # sorted_items = sorted(list(self.items.values()), key=lambda x: x.exit_time)
                 # sorted_items = sorted(sorted_items, key=lambda x: x.time_remain)
@@ -582,7 +797,7 @@ class WarehouseEnvironment:
                 #         datetime.strptime(str(datetime.strptime(self.current_time, "%Y/%m/%d")), "%Y/%m/%d"):
                 #     pass
                 # else:
-                self.set_current_time(datetime.strptime(earliest_item.exit_time, "%Y/%m/%d"))
+                self.set_current_time(earliest_item.exit_time)
 
                 # -------------------分割线----------------------
 
@@ -595,41 +810,27 @@ class WarehouseEnvironment:
         return new_state, reward, done, {}
 
     def out_listed(self):
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        base_filename = f"{current_date}_out_list_records.csv"
-
-        path = base_filename
-
-        # Check if the file with today's date already exists
-
-        with open(path, mode='w', newline='') as file:
-            fieldnames = ['item_id', 'start_time', 'exit_time']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-
-            writer.writeheader()
-            for item in self.out_list:
-                writer.writerow({
-                    'item_id': item.item_id,
-                    'start_time': item.start_time,
-                    'exit_time': item.exit_time
-                })
+        # 只追加最新搬出的分段
+        self.exit_journal.append(self.out_list[-1], self.clock.now)
 
     def save_records_to_csv(self):
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        base_filename = f"{current_date}_simulation_records.csv"
-
-        path = base_filename
-
-        # Check if the file with today's date already exists
-
-        with open(path, mode='w', newline='') as file:
-            fieldnames = ['action', 'agent_position', 'target_position', 'total_reward', 'elapsed_time',
-                          'conflict_count']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
+        """
+        把还没写出的步骤记录追加到文件（任务完成时调用）
+        """
+        self.step_log.flush()
 
-            writer.writeheader()
-            for record in self.step_records:
-                writer.writerow(record)
+    def close(self):
+        """
+        写出并关闭记录文件和绘图
+        """
+        self.step_log.close()
+        self.exit_journal.close()
+        if self.frame_writer is not None:
+            self.frame_writer.close()
+            self.frame_writer = None
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
 
     def handle_conflict_1(self, interfering_item):
         """
@@ -638,10 +839,9 @@ class WarehouseEnvironment:
         self.conflict_count += 2
         self.exchange_agent_item(interfering_item)
 
-        print("冲突解决1： 现在的agent携带的物品是  " + self.agent.item_id.strip('agent_'))
-        print("冲突解决1： 现在的Item携带的物品是  " + self.item.item_id.strip('agent_'))
-        print("任务位置有： ")
-        print(self.task_positions)
+        if self.tracer.level <= DEBUG:
+            self.trace(DEBUG, 'resolve', handler=1, agent=self.agent.item_id, item=self.item.item_id,
+                       task_positions=list(self.task_positions))
         # this is need to code
         self.choose_road(self.agent.x, self.agent.y)
         # self.task_positions.append((self.width, interfering_item.y))
@@ -653,8 +853,8 @@ class WarehouseEnvironment:
         """
         self.conflict_count += 1
         self.agent.color = 'red'
-        print("冲突解决2： 现在的agent携带的物品是  " + self.agent.item_id.strip('agent_'))
-        print("冲突解决2： 现在的Item携带的物品是  " + self.item.item_id.strip('agent_'))
+        if self.tracer.level <= DEBUG:
+            self.trace(DEBUG, 'resolve', handler=2, agent=self.agent.item_id, item=self.item.item_id)
 
         target_row = self.get_target_row(interfering_item)
 
@@ -673,11 +873,11 @@ class WarehouseEnvironment:
         """
         处理冲突的方式3：直接从邻行搬出
         """
-        self.items.update({(self.agent.x, self.agent.y): self.agent})
+        self.place_item(self.agent)
 
         self.agent.color = 'red'
-        print("冲突解决3： 现在的agent携带的物品是  " + self.agent.item_id.strip('agent_'))
-        print("冲突解决3： 现在的Item携带的物品是  " + self.item.item_id.strip('agent_'))
+        if self.tracer.level <= DEBUG:
+            self.trace(DEBUG, 'resolve', handler=3, agent=self.agent.item_id, item=self.item.item_id)
 
         target_row = self.get_target_row(interfering_item)
 
@@ -690,7 +890,7 @@ class WarehouseEnvironment:
             # 获取最后一个物品
             last_item = self.items[last_key]
             self.item = last_item
-            self.items.pop(last_key)
+            self._discard_item(last_key)
             # 保证agent只改变行的位置，而不改变x
             tmp_agent_x = self.agent.x
             self.agent = self.item
@@ -721,7 +921,7 @@ class WarehouseEnvironment:
         self.task_positions.append((self.agent.x, self.agent.y))
         self.agent.item_id = self.agent.item_id.strip('agent_')
         self.remove_item(interfering_item)
-        self.items.update({(self.agent.x, self.agent.y): self.agent})
+        self.place_item(self.agent)
         if len(self.interfering_items) == 0:
             tmp_interfering_item = copy.copy(interfering_item)
             self.interfering_items.append(tmp_interfering_item)
@@ -732,7 +932,8 @@ class WarehouseEnvironment:
                     self.interfering_items.append(tmp_interfering_item)
                     break
 
-        print("干扰物品位置： " + str(interfering_item.x), str(interfering_item.y))
+        self.trace(DEBUG, 'interfering', item_id=interfering_item.item_id, x=interfering_item.x,
+                   y=interfering_item.y)
 
         self.item = interfering_item
         self.agent = self.item
@@ -751,29 +952,14 @@ class WarehouseEnvironment:
         """
 
         # 检查移动到上面的行是否会发生冲突
-        if current_item.length in self.segment_heights:
-            length = current_item.length
-            index = self.segment_heights.index(length)
-        elif (current_item.length + 1) in self.segment_heights:
-            length = current_item.length + 1
-            index = self.segment_heights.index(length)
-        elif (current_item.length + 2) in self.segment_heights:
-            length = current_item.length + 2
-            index = self.segment_heights.index(length)
-        elif (current_item.length + 3) in self.segment_heights:
-            length = current_item.length + 3
-            index = self.segment_heights.index(length)
-        elif (current_item.length + 4) in self.segment_heights:
-            length = current_item.length + 4
-            index = self.segment_heights.index(length)
-        elif (current_item.length + 5) in self.segment_heights:
-            length = current_item.length + 5
-            index = self.segment_heights.index(length)
+        index = self.find_row(current_item.length, 5)
+        if index is not None:
+            length = self.segment_heights[index]
         else:
             length = 20
             index = self.segment_heights.index(length)
         upper_row = length
-        print("upper_row: " + str(upper_row))
+        self.trace(DEBUG, 'target_row', upper_row=upper_row)
         if not self.is_conflict_with_target(upper_row,
                                             current_item) and upper_row >= length and upper_row - length < 2 and \
                 upper_row != 20:
@@ -781,7 +967,7 @@ class WarehouseEnvironment:
 
         # 检查移动到下面的行是否会发生冲突
         lower_row = self.segment_heights[index + 1]
-        print("lower_row: " + str(lower_row))
+        self.trace(DEBUG, 'target_row', lower_row=lower_row)
         if not self.is_conflict_with_target(lower_row,
                                             current_item, 1) and lower_row >= length and lower_row - length < 2 and \
                 lower_row != 8:
@@ -802,28 +988,104 @@ class WarehouseEnvironment:
             :param current_item:
             :param target_row:
         """
-        # 在这里添加检查冲突的逻辑，例如检查与其他物体的碰撞等
-        item = Item(current_item.item_id, current_item.x, current_item.y + target_row, current_item.length,
-                    current_item.width,
-                    current_item.start_time, current_item.processing_time, current_item.exit_time,
-                    current_item.time_remain, current_item.color)
-
-        is_conflict = self.check_collision(current_item, item)
+        # 物品与自身向下平移 target_row 后的矩形是否相交，与 check_collision 的判断等价，不再创建临时 Item
+        is_conflict = current_item.width > 0 and -current_item.length < target_row < current_item.length
 
         return is_conflict
 
-    def reset(self):
-        # Reset the environment to its initial state
-        state = self.initial_state  # Reset the state to the initial state
-        self.agent = Item('agent', 0, 0, 5, 5, '2017/9/1', 0, '2017/9/1', 'black')
+    # 不属于仿真状态的属性：输出用的资源和不会改变的配置
+    NON_STATE_ATTRIBUTES = ('tracer', 'step_log', 'exit_journal', 'colors', 'decision_policy', 'renderer',
+                            'frame_writer')
 
-        self.target_position = (0, 0)  # 目标位置
-        self.agent_has_item = False
-        self.total_reward = 0
-        self.total_step_time = 0
-        self.item = Item('tmp', self.agent.x, self.agent.y, 5, 5, '2017/9/1', 0, '2017/9/1', 'black')
-        self.task_positions = []
-        return state
+    def state_dict(self):
+        """
+        场地的完整仿真状态（物品及其索引、缓存、任务列表、干涉物品、时钟等），用于写检查点。
+        返回值可以 pickle，与场地不共享任何可变对象；对象之间的引用关系（例如 agent 和 item 是同一个物品）保持不变。
+        """
+        return copy.deepcopy({name: value for name, value in self.__dict__.items()
+                              if name not in self.NON_STATE_ATTRIBUTES})
+
+    def load_state_dict(self, state):
+        """
+        用 state_dict 的结果覆盖场地当前的状态，输出用的资源（tracer、记录文件）保持不变
+        """
+        for name, value in copy.deepcopy(state).items():
+            setattr(self, name, value)
+
+    def snapshot(self):
+        """
+        保存仿真中会变化的状态，用于试探性地执行动作后回退，比 deepcopy 整个场地快得多。
+
+        物品只保存字段值，容器和索引保存浅拷贝；输出用的资源（tracer、记录文件）不在快照中，
+        回退后已经写出的记录不会撤销。返回值只交给 restore 使用，同一个快照可以恢复多次。
+        """
+        objects = {id(item): item for item in self.items.values()}
+        for item in self.interfering_items:
+            objects[id(item)] = item
+        objects[id(self.agent)] = self.agent
+        objects[id(self.item)] = self.item
+        return (
+            [(item, ITEM_FIELDS(item)) for item in objects.values() if item is not None],
+            dict(self.items),
+            self.row_index.snapshot(),
+            self.retrieval_queue.snapshot(),
+            self.grid.snapshot(),
+            self.clock.snapshot(),
+            self.cache_items[:],
+            self.cache_counter,
+            self.segment_store.snapshot(),
+            (self.agent, self.item, self.target_position, self.task_positions[:], self.interfering_items[:],
+             self.agent_has_item, self.total_reward, self.total_step_time, self.conflict_count, len(self.out_list)),
+            (self.segment_high[:], self.segment_mid[:], self.segment_low[:], self.segment_heights[:],
+             self.y_positions[:], dict(self.row_of_height), self.layout_dirty,
+             self.seg_high_length, self.seg_mid_length, self.seg_low_length),
+        )
+
+    def restore(self, snapshot):
+        """
+        回到 snapshot 保存时的状态
+        """
+        (fields, items, row_index, retrieval_queue, grid, clock, cache_items, self.cache_counter,
+         segment_store, agent_state, layout) = snapshot
+        slots = Item.__slots__
+        for item, values in fields:
+            for name, value in zip(slots, values):
+                setattr(item, name, value)
+        self.items = dict(items)
+        self.row_index.restore(row_index)
+        self.retrieval_queue.restore(retrieval_queue)
+        self.grid.restore(grid)
+        self.clock.restore(clock)
+        self.cache_items = cache_items[:]
+        self.segment_store.restore(segment_store)
+        (self.agent, self.item, self.target_position, task_positions, interfering_items, self.agent_has_item,
+         self.total_reward, self.total_step_time, self.conflict_count, out_count) = agent_state
+        self.task_positions = task_positions[:]
+        self.interfering_items = interfering_items[:]
+        del self.out_list[out_count:]
+        (segment_high, segment_mid, segment_low, segment_heights, y_positions, row_of_height,
+         self.layout_dirty, self.seg_high_length, self.seg_mid_length, self.seg_low_length) = layout
+        self.segment_high = segment_high[:]
+        self.segment_mid = segment_mid[:]
+        self.segment_low = segment_low[:]
+        self.segment_heights = segment_heights[:]
+        self.y_positions = y_positions[:]
+        self.row_of_height = dict(row_of_height)
+
+    def save_initial_state(self):
+        """
+        把当前状态记为 reset() 恢复到的初始状态
+        """
+        self.initial_snapshot = self.snapshot()
+
+    def reset(self):
+        """
+        回到初始状态（第一次 step 之前或者最近一次 save_initial_state 时的状态），返回新的状态
+        """
+        if self.initial_snapshot is None:
+            self.save_initial_state()
+        self.restore(self.initial_snapshot)
+        return self.get_state()
 
     """
     添加物品到 环境当中
@@ -846,10 +1108,30 @@ class WarehouseEnvironment:
         """
         if item is None:
             return False
-        position = (item.x, item.y)
-        del self.items[position]
+        self._discard_item((item.x, item.y))
         return True
 
+    def place_item(self, item):
+        """
+        把物品放到场地中它当前的 (x, y) 位置，同步更新索引
+        """
+        key = (item.x, item.y)
+        if key in self.items:
+            self._discard_item(key)
+        self.items[key] = item
+        self.row_index.add(key, item)
+        self.retrieval_queue.push(key, item)
+        self.grid.add(key, item)
+
+    def _discard_item(self, key):
+        item = self.items.pop(key)
+        if self._conflict_removed is not None:
+            self._conflict_removed.append((self.grid.order(key), item))
+        self.row_index.remove(key, item)
+        self.retrieval_queue.discard(key)
+        self.grid.remove(key)
+        return item
+
     def binary_search_insert(self, lst, value):
         # 二分查找插入元素到有序列表中
         left, right = 0, len(lst) - 1
@@ -872,20 +1154,26 @@ class WarehouseEnvironment:
                     and self.seg_mid_length <= height and self.seg_low_length <= height:
                 return
 
-        for i in self.segment_heights:
-            if i == height:
-                return
-        # 判断属于的段并进行二分查找插入
+        if height in self.row_of_height:
+            return
+        # 判断属于的段并进行二分查找插入，新增了行才需要重新计算布局
         if self.seg_mid <= height < self.seg_high and self.seg_high_length >= height:
             self.binary_search_insert(self.segment_high, height)
             self.seg_high_length -= height
+            self.layout_dirty = True
         elif self.seg_low < height < self.seg_mid and self.seg_mid_length >= height:
             self.binary_search_insert(self.segment_mid, height)
             self.seg_mid_length -= height
+            self.layout_dirty = True
         elif 0 < height <= self.seg_low and self.seg_low_length >= height:
             self.binary_search_insert(self.segment_low, height)
             self.seg_low_length -= height
+            self.layout_dirty = True
 
+    def rebuild_layout(self):
+        """
+        根据三个分段列表重新计算 segment_heights、y_positions 和 row_of_height，只在行的集合变化后调用
+        """
         self.segment_heights = []
         self.segment_high.sort(reverse=True)
         self.segment_heights.extend(self.segment_high)
@@ -894,6 +1182,35 @@ class WarehouseEnvironment:
         self.segment_low.sort(reverse=True)
         self.segment_heights.extend(self.segment_low)
 
+        # 创建一个列表来存储y轴刻度的位置
+        if self.tag_top:
+            current_y = 20
+        else:
+            current_y = 1
+        self.y_positions = []
+        for i in range(len(self.segment_heights)):
+            if len(self.segment_mid) > 0 and self.segment_heights[i] == self.segment_mid[0]:
+                current_y = 92
+            elif len(self.segment_low) > 0 and self.segment_heights[i] == self.segment_low[0]:
+                current_y = 150
+            self.y_positions.append(current_y)
+            current_y += self.segment_heights[i]
+
+        self.row_of_height = {}
+        for index, height in enumerate(self.segment_heights):
+            self.row_of_height.setdefault(height, index)
+        self.layout_dirty = False
+
+    def find_row(self, length, slack):
+        """
+        返回第一个行高在 [length, length + slack] 之间的行（按 length, length + 1, ... 的顺序查找），没有则返回 None
+        """
+        for height in range(length, length + slack + 1):
+            index = self.row_of_height.get(height)
+            if index is not None:
+                return index
+        return None
+
     def initialize_segment(self, seg_high_length=74, seg_mid_length=58, seg_low_length=68, seg_high=20,
                            seg_mid=16, seg_low=12):
         self.seg_high = seg_high  #
@@ -916,65 +1233,50 @@ class WarehouseEnvironment:
         - 无返回值
         """
         length_check = len(self.items)
-        item = self.add_item(item_id, x, y, length, width, start_time, processing_time, exit_time, time_remain)
+        # 日期只在进入环境时解析一次，之后都是整数
+        start_time = parse_time(start_time)
+        exit_time = parse_time(exit_time)
+        if len(self.items) >= self.number:
+            # 如果空地上的物品数量已经达到限制，你可以采取适当的操作，例如引发异常
+            raise ValueError("空地上的物品数量已经达到限制")
         # print(item_id + "  " + item.start_time.__str__())
-        self.divide_seg(item.length)
-        # 创建一个列表来存储y轴刻度的位置
-        if self.tag_top:
-            current_y = 20
-        else:
-            current_y = 1
-        self.y_positions = []
-        if self.tag_bottom and self.tag_top:
+        self.divide_seg(length)
+        if self.tag_bottom and self.tag_top and self.height != 173:
             self.height = 173
-        #
-
-        for i in range(len(self.segment_heights)):
-            if len(self.segment_mid) > 0 and self.segment_heights[i] == self.segment_mid[0]:
-                current_y = 92
-            elif len(self.segment_low) > 0 and self.segment_heights[i] == self.segment_low[0]:
-                current_y = 150
-            self.y_positions.append(current_y)
-            current_y += self.segment_heights[i]
-
-        if self.current_time >= datetime.strptime(item.start_time, "%Y/%m/%d"):
+            # 栅格的行数和下方道路的位置随场地高度变化
+            self.grid.resize(self.width, self.height)
+        if self.layout_dirty:
+            self.rebuild_layout()
+
+        if self.current_time >= start_time:
+            item = self.add_item(item_id, x, y, length, width, start_time, processing_time, exit_time,
+                                 time_remain)
             # print("添加物品时当前时间 :" + self.current_time.__str__())
             # print("进入物品的开始时间和 id:" + item.item_id + "   " + item.start_time.__str__())
             # 检查相同 y 坐标的物品
-            if item.length in self.segment_heights:
-                index = self.segment_heights.index(item.length)
-            elif (item.length + 1) in self.segment_heights:
-                index = self.segment_heights.index(item.length + 1)
-            elif (item.length + 2) in self.segment_heights:
-                index = self.segment_heights.index(item.length + 2)
-            elif (item.length + 3) in self.segment_heights:
-                index = self.segment_heights.index(item.length + 3)
-            elif (item.length + 4) in self.segment_heights:
-                index = self.segment_heights.index(item.length + 4)
-            else:
+            index = self.find_row(item.length, 4)
+            if index is None:
                 index = 0
             item.y = self.y_positions[index]
             # print("item.id:      " + item.item_id + "             " + str(item.y))
             # print("item.length:      " + str(self.segment_heights[index]) + "             " + str(item.length))
-            com_y_items = self.filter_item_by_y(item.y)
-            com_y_items.sort(key=lambda x: x.x, reverse=True)
-            if com_y_items:
+            last_item = self.row_index.rightmost_in_row(item.y, 1)
+            if last_item is not None:
                 # 如果存在相同 y 坐标的物品，则设置添加物品的 x 为前面物品的 x + width
-                last_item = com_y_items[0]
                 item.x = last_item.x + last_item.width + 1
             else:
                 # 如果不存在相同 y 坐标的物品，则设置添加物品的 x
                 item.x = item.x + 1
-            self.items[(item.x, item.y)] = item
+            self.place_item(item)
         else:
-            if len(self.cache_items) == 0:
-                self.cache_items.append(item)
-            else:
-                if item not in self.cache_items:
-                    self.cache_items.append(item)
+            # 未到达的物品只在 segment_store 中占一行
+            row = self.segment_store.append(item_id, x, y, length, width, start_time, processing_time, exit_time,
+                                            time_remain)
+            self.cache_counter += 1
+            heapq.heappush(self.cache_items, (start_time, self.cache_counter, self.segment_store.view(row)))
 
         if len(self.items) - length_check == 0:
-            print("add error")
+            self.trace(DEBUG, 'add_error', item_id=item_id)
 
     def filter_item_by_y(self, y):
         """
@@ -982,11 +1284,7 @@ class WarehouseEnvironment:
 
         :return: items列表
         """
-        items_com = []
-        for (k, v) in self.items.items():
-            if k[1] == y or k[1] + 1 == y or k[1] - 1 == y:
-                items_com.append(v)
-        return items_com
+        return self.row_index.items_near_row(y, 1)
 
     def check_collision(self, item1, item2):
         epsilon = 0.1  # 误差
@@ -1020,11 +1318,11 @@ class WarehouseEnvironment:
         清除道路上的物品
         :return: item_id
         """
-        for (k, v) in self.items.items():
-            if k[0] >= self.width or k[0] < 0 or v.get_rectangle()[3] >= self.height or k[1] < 0:
-                item_id = v.item_id
-                self.remove_item(v)
-                return item_id
+        on_road = self.row_index.beyond_bounds(self.width, self.height)
+        if on_road:
+            item = on_road[0]
+            self.remove_item(item)
+            return item.item_id
 
     def x_and_y(self):
         left_N = 0
@@ -1094,36 +1392,39 @@ class WarehouseEnvironment:
 
         return right_N, left_N, top_N, bottom_N
 
-    def render(self):
-        plt.figure(figsize=(5, 5))
-        list_num = self.x_and_y()
-
-        # Draw agent
-        agent_x = self.agent.x
-        agent_y = self.agent.y
-        agent_width = self.agent.width
-        agent_length = self.agent.length
-        agent_color = self.agent.color
-
-        agent_rect = plt.Rectangle((agent_x, agent_y), agent_width, agent_length, color=agent_color, alpha=0.5)
-        plt.gca().add_patch(agent_rect)
-
-        # 添加文本 "box1" 到方块内部
-        text_x = agent_x + agent_width / 2
-        text_y = agent_y + agent_length / 2
-        plt.text(text_x, text_y, self.agent.item_id, ha='center', va='center', fontsize=6, color='black')
-
-        for (x, y), item in self.items.items():
-            rect = plt.Rectangle((x, y), item.width, item.length, color=item.color, alpha=0.5)
-            plt.gca().add_patch(rect)
-            # 添加文本 "box1" 到方块内部
-            text_x = x + item.width / 2
-            text_y = y + item.length / 2
-            plt.text(text_x, text_y, item.item_id, ha='center', va='center', fontsize=6, color='black')
-
-        self.draw_road(list_num[0], list_num[1], list_num[2], list_num[3])
+    def render(self, offscreen=False):
+        """
+        绘制当前场地。第一次调用时创建 SceneRenderer，之后只更新变化了的分段；
+        offscreen=True 时用 Agg 在内存中绘制，不弹出窗口，可以配合 record_frames 或 renderer.frame() 使用
+        """
+        if self.renderer is None:
+            self.renderer = SceneRenderer(self, offscreen=offscreen)
+        self.renderer.update()
+        if self.frame_writer is not None:
+            self.frame_writer.write()
+        else:
+            self.renderer.show()
 
-        plt.show()
+    def render_frame(self, scale=1):
+        """
+        直接用占据栅格生成 uint8 的 RGB 帧，不经过 matplotlib；scale 为每个格子放大成的像素数
+        """
+        frame = self.grid.frame()
+        if self.agent is not None:
+            frame[self.grid.window(self.agent)] = 0
+        if scale > 1:
+            frame = frame.repeat(scale, axis=0).repeat(scale, axis=1)
+        return frame
+
+    def record_frames(self, path, fps=10, offscreen=True):
+        """
+        之后每次 render 都把画面写到 path：视频文件（.gif/.mp4/.avi）或图片序列（如 'frames/frame_%06d.png'）
+        """
+        if self.renderer is None:
+            self.renderer = SceneRenderer(self, offscreen=offscreen)
+        if self.frame_writer is not None:
+            self.frame_writer.close()
+        self.frame_writer = FrameWriter(self.renderer, path, fps)
 
     def draw_road(self, right_N, left_N, top_N, bottom_N):
         if self.tag_right:
@@ -1166,7 +1467,7 @@ class WarehouseEnvironment:
 
     def getInitItem(self):
         if self.tag_top:
-            init_item = Item('item', 0, 20, 5, 5, '2017/9/1', 0, '2017/9/1', 0, 'black')
+            init_item = Item('item', 0, 20, 5, 5, INIT_TIME, 0, INIT_TIME, 0, 'black')
         else:
-            init_item = Item('item', 0, 0, 5, 5, '2017/9/1', 0, '2017/9/1', 0, 'black')
+            init_item = Item('item', 0, 0, 5, 5, INIT_TIME, 0, INIT_TIME, 0, 'black')
         return init_item
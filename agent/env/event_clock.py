@@ -0,0 +1,78 @@
+import heapq
+
+ARRIVAL = 'arrival'  # 分段到达场地
+EXIT = 'exit'  # 分段到达最早出场时间
+TRANSPORT = 'transport'  # 一次搬运完成
+
+
+class EventClock:
+    """
+    离散事件仿真时钟。
+
+    now 是仿真时间（整数秒，见 sim_time），只会被 advance / jump_to 推进，与主机运行快慢无关；
+    唯一可以让时钟倒退的是 reset，用于一次任务结束后重新设定计时起点。
+    事件按 (时间, 登记顺序) 排在堆中，推进时钟时按顺序弹出所有到期的事件；
+    空闲时可以用 jump_to 直接跳到下一个事件的时间，中间的空闲时段不需要逐步模拟。
+    """
+
+    def __init__(self, now):
+        self.now = now
+        self._queue = []
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def schedule(self, time, kind, payload=None):
+        self._counter += 1
+        heapq.heappush(self._queue, (time, self._counter, kind, payload))
+
+    def next_time(self):
+        """
+        返回下一个事件的时间，没有事件时返回 None。
+        """
+        if self._queue:
+            return self._queue[0][0]
+        return None
+
+    def next_kind(self):
+        """
+        返回下一个事件的类型，没有事件时返回 None。
+        """
+        if self._queue:
+            return self._queue[0][2]
+        return None
+
+    def advance(self, seconds):
+        """
+        时钟前进 seconds 秒，返回这段时间内到期的事件 [(time, kind, payload), ...]。
+        """
+        self.now += seconds
+        return self._pop_due()
+
+    def jump_to(self, time):
+        """
+        时钟直接跳到 time（不会倒退），返回到期的事件。
+        """
+        self.now = max(self.now, time)
+        return self._pop_due()
+
+    def reset(self, time):
+        """
+        把时钟直接设为 time，允许倒退。已经排队的事件保留，早于 time 的事件在下一次推进时弹出
+        """
+        self.now = time
+
+    def snapshot(self):
+        return self.now, self._queue[:], self._counter
+
+    def restore(self, snapshot):
+        self.now, queue, self._counter = snapshot
+        self._queue = queue[:]
+
+    def _pop_due(self):
+        due = []
+        while self._queue and self._queue[0][0] <= self.now:
+            time, _, kind, payload = heapq.heappop(self._queue)
+            due.append((time, kind, payload))
+        return due
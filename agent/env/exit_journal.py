@@ -0,0 +1,107 @@
+import csv
+import io
+import os
+
+from env.log_files import claim, release
+from env.sim_time import format_date, to_datetime
+
+JOURNAL_FIELDS = ['item_id', 'start_time', 'exit_time', 'out_time']
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+class ExitJournal:
+    """
+    出场记录的只追加日志。
+
+    文件句柄一直打开，每搬出一个分段只追加一行（一次 write），写完立即 flush，
+    其他进程在运行过程中就可以读到已经写出的记录。out_time 是搬出时的仿真时间。
+
+    fsync 策略：
+    - 'always': 每条记录都 fsync，断电也不丢记录
+    - 'interval': 每 fsync_every 条记录 fsync 一次
+    - 'never': 只 flush 到操作系统
+
+    打开已有文件时会截掉上次崩溃留下的不完整的最后一行，保证文件中每一行都是完整的记录。
+    这一行可能是另一个日志正在写的记录，所以同一进程中同一时间只能有一个 ExitJournal 写某个文件
+    （见 log_files.claim），重复打开会抛出 ValueError。
+    """
+
+    def __init__(self, path, fsync='interval', fsync_every=100):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        claim(path, self)
+        self.path = path
+        self.fsync = fsync
+        self.fsync_every = fsync_every
+        self._pending = 0
+        self._file = None
+        self._line = io.StringIO()
+        self._writer = csv.writer(self._line)
+
+    def _open(self):
+        # 第一次写记录时才打开文件，没有出场记录的环境不会创建文件
+        claim(self.path, self)
+        self._file = open(self.path, mode='a+b')
+        size = self._file.seek(0, os.SEEK_END)
+        if size > 0:
+            self._file.seek(size - 1)
+            if self._file.read(1) != b'\n':
+                self._truncate_partial_line(size)
+        if self._file.tell() == 0:
+            self._write(JOURNAL_FIELDS)
+
+    def _truncate_partial_line(self, size):
+        # 从末尾向前找到最后一个换行符，去掉其后的半行
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            self._file.seek(position - step)
+            index = self._file.read(step).rfind(b'\n')
+            if index >= 0:
+                position = position - step + index + 1
+                break
+            position -= step
+        self._file.truncate(position)
+        self._file.seek(position)
+
+    def _write(self, row):
+        self._line.seek(0)
+        self._line.truncate()
+        self._writer.writerow(row)
+        self._file.write(self._line.getvalue().encode('utf-8'))
+        self._file.flush()
+
+    def append(self, item, now):
+        """
+        追加一个出场分段的记录，now 是搬出时的仿真时间（整数秒）
+        """
+        if self._file is None:
+            self._open()
+        self._write([item.item_id, format_date(item.start_time), format_date(item.exit_time), to_datetime(now)])
+        self._pending += 1
+        if self.fsync == 'always' or (self.fsync == 'interval' and self._pending >= self.fsync_every):
+            self.sync()
+
+    def sync(self):
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def close(self):
+        if self._file is not None:
+            if self.fsync != 'never':
+                self.sync()
+            self._file.close()
+            self._file = None
+        release(self.path, self)
+
+
+def read_journal(path):
+    """
+    读取出场记录，返回字典列表；正在写入的不完整的最后一行会被忽略，可以在运行过程中调用
+    """
+    with open(path, mode='rb') as file:
+        data = file.read()
+    end = data.rfind(b'\n') + 1
+    return list(csv.DictReader(io.StringIO(data[:end].decode('utf-8'), newline='')))
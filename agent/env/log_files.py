@@ -0,0 +1,35 @@
+import os
+import weakref
+
+_writers = weakref.WeakValueDictionary()  # 绝对路径 -> 正在写这个文件的记录对象
+
+
+def claim(path, writer):
+    """
+    登记 writer 独占写 path。同一进程中另一个还在使用的记录对象已经登记了这个文件时抛出 ValueError，
+    避免几个场地的记录交错写进同一个文件。writer 被回收或 release 之后文件可以再被登记
+    """
+    key = os.path.abspath(path)
+    holder = _writers.get(key)
+    if holder is not None and holder is not writer:
+        raise ValueError(f"{path} is already being written by another {type(holder).__name__}")
+    _writers[key] = writer
+
+
+def release(path, writer):
+    key = os.path.abspath(path)
+    if _writers.get(key) is writer:
+        del _writers[key]
+
+
+def unclaimed_path(stem, extension):
+    """
+    默认的记录文件名：stem + extension 没有被登记时就用它，否则依次尝试 stem_1、stem_2……，
+    同一进程中创建的多个场地各自写自己的文件
+    """
+    path = stem + extension
+    number = 0
+    while os.path.abspath(path) in _writers:
+        number += 1
+        path = f"{stem}_{number}{extension}"
+    return path
@@ -0,0 +1,312 @@
+import numpy as np
+import matplotlib.colors as mcolors
+
+FREE = 0
+ROAD_CODES = {'right': -1, 'left': -2, 'top': -3, 'bottom': -4}  # 道路格子的取值，分段格子是从 1 开始的槽号
+_PALETTE_OFFSET = len(ROAD_CODES)  # 调色板下标 = 格子取值 + _PALETTE_OFFSET
+
+
+def _rgb(color):
+    return np.array(mcolors.to_rgb(color)) * 255
+
+
+class OccupancyGrid:
+    """
+    场地的整数栅格：每个格子是 0（空地）、道路编号（负数）或占据它的分段的槽号（正数）。
+
+    栅格覆盖场地和四周的道路，cells[row, column] 对应坐标 (column + x_offset, row)。
+    分段按 WarehouseEnvironment.items 的键登记，放入、移走时只改动它的矩形覆盖的格子；
+    counts 记录每个格子被几个分段覆盖，分段重叠时移走上面的分段会把下面的分段补画回来。
+
+    frame() 用调色板查表得到 uint8 的 RGB 图像，observation() 是给学习器用的单通道图像，都只有 NumPy 运算。
+
+    区域查询（first_free_x）使用被占格子的二维前缀和（summed-area table），
+    任意矩形内被占格子的个数是四次查表；前缀和在分段变化后的第一次查询时重新计算一次。
+    is_free、overlapping 在前缀和已经算好时也用它，分段变化后则直接检查矩形内的格子。
+    只有坐标都是整数、且完全落在栅格内的分段和矩形才能用格子精确判断相交，其他情况下 is_free 保守地返回 False。
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.roads = []
+        self._slots = [None]  # 槽号 -> (key, item, 登记时的切片, 切片是否精确, 登记顺序)，0 号不用
+        self._free = []
+        self._keys = {}  # key -> 槽号
+        self._order = 0  # 最近一次登记的顺序号，与 WarehouseEnvironment.items 中的先后顺序一致
+        self._inexact = 0  # 坐标不是整数或超出栅格的分段个数，不为 0 时格子不能精确代表分段
+        self._table = None
+        self._allocate()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _allocate(self):
+        widths = {road['name']: road.get('width', road.get('height')) for road in self.roads}
+        self.x_offset = -widths.get('left', 0)
+        columns = self.width + widths.get('right', 0) - self.x_offset
+        rows = self.height + widths.get('bottom', 0)
+        self.base = np.full((rows, columns), FREE, dtype=np.int32)
+        self._table = None
+        for road in self.roads:
+            name = road['name']
+            if name == 'right':
+                self.base[:self.height, self._column(self.width):] = ROAD_CODES[name]
+            elif name == 'left':
+                self.base[:self.height, :self._column(0)] = ROAD_CODES[name]
+            elif name == 'top':
+                self.base[:road['height'], self._column(0):self._column(self.width)] = ROAD_CODES[name]
+            elif name == 'bottom':
+                self.base[self.height:, :] = ROAD_CODES[name]
+        self.cells = self.base.copy()
+        self.counts = np.zeros(self.base.shape, dtype=np.int16)
+        self._road_table = self._summed_area(self.base < FREE)
+        self._inexact = 0
+        self.palette = np.full((_PALETTE_OFFSET + max(len(self._slots), 64), 3), 255, dtype=np.uint8)
+        for road in self.roads:
+            self.palette[ROAD_CODES[road['name']] + _PALETTE_OFFSET] = _rgb(road['color'])
+        for slot, entry in enumerate(self._slots):
+            if entry is not None:
+                key, item, _, _, order = entry
+                self._slots[slot] = (key, item) + self._paint(slot, item) + (order,)
+
+    def set_roads(self, roads):
+        """
+        道路变化后重新分配栅格，已登记的分段重新画上去
+        """
+        self.roads = list(roads)
+        self._allocate()
+
+    def resize(self, width, height):
+        """
+        场地大小变化后重新分配栅格，已登记的分段重新画上去
+        """
+        if (width, height) != (self.width, self.height):
+            self.width = width
+            self.height = height
+            self._allocate()
+
+    def _column(self, x):
+        return int(x) - self.x_offset
+
+    def window(self, item):
+        """
+        分段矩形在栅格中的切片，超出栅格的部分被截掉
+        """
+        return self._clip(*item.get_rectangle())[0]
+
+    def _clip(self, left, top, right, bottom):
+        """
+        矩形在栅格中的切片，以及切片是否与矩形完全一致（坐标是整数、面积不为 0 且没有被截掉）。
+        面积为 0 的矩形不占格子，但按 check_collision 的规则仍可能与其他矩形相交，所以不算一致
+        """
+        rows, columns = self.cells.shape
+        window = (slice(min(max(int(top), 0), rows), min(max(int(bottom), 0), rows)),
+                  slice(min(max(self._column(left), 0), columns), min(max(self._column(right), 0), columns)))
+        exact = (left < right and top < bottom and
+                 left == int(left) and top == int(top) and right == int(right) and bottom == int(bottom) and
+                 window[0].start == top and window[0].stop == bottom and
+                 window[1].start == self._column(left) and window[1].stop == self._column(right))
+        return window, exact
+
+    def _paint(self, slot, item):
+        window, exact = self._clip(*item.get_rectangle())
+        self.cells[window] = slot
+        self.counts[window] += 1
+        self.palette[slot + _PALETTE_OFFSET] = _rgb(item.color)
+        self._inexact += not exact
+        self._table = None
+        return window, exact
+
+    def add(self, key, item):
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._slots)
+            self._slots.append(None)
+            if slot + _PALETTE_OFFSET >= len(self.palette):
+                self.palette = np.concatenate([self.palette, np.full_like(self.palette, 255)])
+        self._keys[key] = slot
+        self._order += 1
+        self._slots[slot] = (key, item) + self._paint(slot, item) + (self._order,)
+        return slot
+
+    def remove(self, key):
+        slot = self._keys.pop(key)
+        # 按登记时的切片擦除，分段的坐标在登记后可能已经被改动
+        _, item, window, exact, _ = self._slots[slot]
+        self._slots[slot] = None
+        self._free.append(slot)
+        self._inexact -= not exact
+        self._table = None
+        cells = self.cells[window]
+        counts = self.counts[window]
+        counts -= 1
+        mine = cells == slot
+        cells[mine] = self.base[window][mine]
+        if (counts[mine] > 0).any():
+            # 下面还压着其他分段，把它们露出来的部分补画回来
+            for other_slot, rows, columns in self._overlapping(window):
+                region = self.cells[rows, columns]
+                region[region <= FREE] = other_slot
+        return item
+
+    def _overlapping(self, window):
+        """
+        与切片 window 相交的已登记分段 [(槽号, 相交部分的行切片, 列切片)]，只在分段重叠时使用
+        """
+        rows, columns = window
+        found = []
+        for slot, entry in enumerate(self._slots):
+            if entry is None:
+                continue
+            other_rows, other_columns = entry[2]
+            top, bottom = max(rows.start, other_rows.start), min(rows.stop, other_rows.stop)
+            left, right = max(columns.start, other_columns.start), min(columns.stop, other_columns.stop)
+            if top < bottom and left < right:
+                found.append((slot, slice(top, bottom), slice(left, right)))
+        return found
+
+    @property
+    def last_order(self):
+        """
+        最近一次登记的顺序号，之后登记的分段顺序号都比它大
+        """
+        return self._order
+
+    def order(self, key):
+        """
+        按 key 登记的分段的登记顺序号
+        """
+        return self._slots[self._keys[key]][4]
+
+    def item_at(self, x, y):
+        """
+        坐标 (x, y) 处的分段，空地、道路或栅格外返回 None
+        """
+        row, column = int(y), self._column(x)
+        if not (0 <= row < self.cells.shape[0] and 0 <= column < self.cells.shape[1]):
+            return None
+        slot = self.cells[row, column]
+        return self._slots[slot][1] if slot > FREE else None
+
+    def clear(self):
+        self._slots = [None]
+        self._free = []
+        self._keys = {}
+        self._inexact = 0
+        self._table = None
+        self.cells = self.base.copy()
+        self.counts[:] = 0
+
+    def snapshot(self):
+        return (self.cells.copy(), self.counts.copy(), self.palette.copy(), self._slots[:], self._free[:],
+                dict(self._keys), self._inexact, self._order)
+
+    def restore(self, snapshot):
+        cells, counts, palette, slots, free, keys, self._inexact, self._order = snapshot
+        self._table = None
+        self.cells = cells.copy()
+        self.counts = counts.copy()
+        self.palette = palette.copy()
+        self._slots = slots[:]
+        self._free = free[:]
+        self._keys = dict(keys)
+
+    def frame(self):
+        """
+        当前栅格的 RGB 图像，形状 (rows, columns, 3)，dtype uint8
+        """
+        return self.palette[self.cells + _PALETTE_OFFSET]
+
+    def observation(self):
+        """
+        单通道的场地图像：1 为分段，-1 为道路，0 为空地
+        """
+        return np.sign(self.cells).astype(np.int8)
+
+    @staticmethod
+    def _summed_area(mask):
+        table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int32)
+        np.cumsum(np.cumsum(mask, axis=0, dtype=np.int32), axis=1, out=table[1:, 1:])
+        return table
+
+    def _occupied_table(self):
+        if self._table is None:
+            self._table = self._summed_area(self.counts > 0)
+        return self._table
+
+    @staticmethod
+    def _count(table, window):
+        rows, columns = window
+        return int(table[rows.stop, columns.stop] - table[rows.start, columns.stop] -
+                   table[rows.stop, columns.start] + table[rows.start, columns.start])
+
+    def is_free(self, left, top, right, bottom, roads=False):
+        """
+        矩形 (left, top, right, bottom) 内没有任何分段（roads=True 时也不能压到道路）时返回 True。
+        前缀和是最新的时候是 O(1)；分段刚变化过时直接检查窗口内的格子，不为一次查询重新计算整个栅格的前缀和
+        （冲突处理中每次搬动分段之后紧接着就是一次查询）。
+        无法用格子精确判断时返回 False，调用方应回退到逐个分段的精确判断
+        """
+        window, exact = self._clip(left, top, right, bottom)
+        if not exact or self._inexact:
+            return False
+        if self._table is None:
+            if self.counts[window].any():
+                return False
+        elif self._count(self._table, window):
+            return False
+        return not (roads and self._count(self._road_table, window))
+
+    def first_free_x(self, y, length, width, start=0, roads=True):
+        """
+        在 [y, y + length) 这一行中找 x >= start 的第一个能放下宽 width 的分段的位置，放不下时返回 None。
+        用前缀和得到每一列的占用，再对列做一次滑动窗口求和，都是 O(列数) 的向量运算。
+
+        这是给调用方（例如按空位放置分段的规划）使用的查询；check_item 仍按原来的规则接在行中最右边的分段之后，
+        改成第一个空位会改变仿真产生的场地布局。只按格子判断，坐标不是整数的分段按截断后的格子计算，栅格外的分段不考虑
+        """
+        if width < 1:
+            raise ValueError(f"width must be at least 1, got {width}")
+        window, exact = self._clip(start, y, start + width, y + length)
+        if not exact:
+            return None
+        rows = window[0]
+        blocked = self._occupied_table()[rows.stop] - self._occupied_table()[rows.start]
+        if roads:
+            blocked = blocked + self._road_table[rows.stop] - self._road_table[rows.start]
+        # blocked 是按列累计的被占格子数，宽 width 的窗口内被占格子数为两端之差
+        counts = blocked[width:] - blocked[:-width]
+        candidates = np.flatnonzero(counts[window[1].start:] == 0)
+        if len(candidates) == 0:
+            return None
+        return int(candidates[0]) + window[1].start + self.x_offset
+
+    def overlapping(self, left, top, right, bottom, after=0, until=None):
+        """
+        与矩形（例如 agent 携带分段扫过的区域）相交的分段 [(登记顺序, item)]，按登记顺序排列；
+        只返回登记顺序在 (after, until] 之间的分段，until 为 None 时没有上限。
+        矩形空闲时只需一次 is_free；否则取窗口中出现的槽号，被压在下面的分段再按登记时的切片补上
+        """
+        if self.is_free(left, top, right, bottom):
+            return []
+        window, exact = self._clip(left, top, right, bottom)
+        if not exact or self._inexact:
+            # 格子不能精确代表矩形时按实际坐标逐个判断
+            rectangle = (left, top, right, bottom)
+            slots = [slot for slot, entry in enumerate(self._slots)
+                     if entry is not None and _intersects(entry[1].get_rectangle(), rectangle)]
+        elif self.counts[window].max() > 1:
+            slots = [slot for slot, _, _ in self._overlapping(window)]
+        else:
+            slots = [int(slot) for slot in np.unique(self.cells[window]) if slot > FREE]
+        entries = [self._slots[slot] for slot in slots]
+        return sorted((entry[4], entry[1]) for entry in entries
+                      if entry[4] > after and (until is None or entry[4] <= until))
+
+
+def _intersects(rectangle1, rectangle2):
+    # 与 WarehouseEnvironment.check_collision 相同的相交规则
+    return (rectangle1[0] < rectangle2[2] and rectangle1[2] > rectangle2[0] and
+            rectangle1[1] < rectangle2[3] and rectangle1[3] > rectangle2[1])
@@ -0,0 +1,185 @@
+import os
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+VIDEO_WRITERS = {'.gif': animation.PillowWriter, '.mp4': animation.FFMpegWriter, '.avi': animation.FFMpegWriter}
+
+
+class SceneRenderer:
+    """
+    WarehouseEnvironment 的增量绘制。
+
+    整个运行过程只创建一个 figure；坐标轴、背景和道路在第一次绘制时画好，之后不再变化。
+    每个分段对应一个矩形和一个文字标注，按分段在 env.items 中的键（放入时的坐标）登记，
+    场地中可能有编号相同的分段，所以不按 item_id 登记。update 只改动位置、大小、颜色或编号变化了的分段，
+    新放入的分段添加图元，移走的分段删除图元。
+
+    offscreen=True 时直接用 Agg 画布在内存中绘制，不经过 pyplot，也不会弹出窗口，
+    配合 frame() 或 FrameWriter 把每一步写成图片序列或视频。
+    """
+
+    def __init__(self, env, offscreen=False, figsize=(5, 5), dpi=100):
+        self.env = env
+        self.offscreen = offscreen
+        if offscreen:
+            self.figure = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(self.figure)
+        else:
+            self.figure = plt.figure(figsize=figsize, dpi=dpi)
+        self.axes = self.figure.add_subplot()
+        self.artists = {}  # env.items 的键 -> (矩形, 文字, 上次绘制时的 (x, y, width, length, color, item_id))
+        self.agent_artists = None
+        self.rows = None
+        self._setup_axes()
+
+    def _setup_axes(self):
+        # 与 x_and_y、draw_road 画出的坐标轴和道路相同
+        env = self.env
+        axes = self.axes
+        roads = {road['name']: road for road in env.roads}
+        if env.tag_left:
+            axes.set_xticks([-roads['left']['width'], 0, env.width])
+        else:
+            axes.set_xticks([0, env.width])
+        axes.tick_params(labelsize=8)
+        height = env.height + 20 if env.tag_top or env.tag_bottom else env.height
+        axes.imshow(np.ones((height, env.width)), cmap='binary', interpolation='none', origin='upper')
+        if env.tag_left and env.tag_right:
+            axes.set_xlim(-20, env.width + 20)
+        else:
+            axes.set_xlim(0, env.width)
+
+        if env.tag_right:
+            axes.add_patch(Rectangle((env.width, 0), roads['right']['width'], env.height,
+                                     color=roads['right']['color'], alpha=1))
+        if env.tag_left:
+            axes.add_patch(Rectangle((-roads['left']['width'], 0), roads['left']['width'], env.height,
+                                     color=roads['left']['color'], alpha=1))
+        if env.tag_top:
+            axes.add_patch(Rectangle((0, 0), env.width, roads['top']['height'], color=roads['top']['color'],
+                                     alpha=1))
+        if env.tag_bottom:
+            axes.add_patch(Rectangle((-20, env.height), env.width + 40, roads['bottom']['height'],
+                                     color=roads['bottom']['color'], alpha=1))
+
+    def _add(self, item):
+        rect = Rectangle((item.x, item.y), item.width, item.length, color=item.color, alpha=0.5)
+        self.axes.add_patch(rect)
+        text = self.axes.text(item.x + item.width / 2, item.y + item.length / 2, item.item_id,
+                              ha='center', va='center', fontsize=6, color='black')
+        return rect, text
+
+    @staticmethod
+    def _move(artists, item):
+        rect, text = artists
+        rect.set_xy((item.x, item.y))
+        rect.set_width(item.width)
+        rect.set_height(item.length)
+        rect.set_color(item.color)
+        text.set_position((item.x + item.width / 2, item.y + item.length / 2))
+        text.set_text(item.item_id)
+
+    def update(self):
+        """
+        把图元同步到场地的当前状态，返回本次改动的分段数
+        """
+        env = self.env
+        rows = (tuple(env.y_positions), tuple(env.segment_heights))
+        if rows != self.rows:
+            self.axes.set_yticks(env.y_positions, [str(height) for height in env.segment_heights])
+            self.rows = rows
+
+        changed = 0
+        for key, item in env.items.items():
+            state = (item.x, item.y, item.width, item.length, item.color, item.item_id)
+            entry = self.artists.get(key)
+            if entry is None:
+                rect, text = self._add(item)
+                self.artists[key] = (rect, text, state)
+                changed += 1
+            elif entry[2] != state:
+                self._move(entry[:2], item)
+                self.artists[key] = (entry[0], entry[1], state)
+                changed += 1
+        for key in [key for key in self.artists if key not in env.items]:
+            rect, text, _ = self.artists.pop(key)
+            rect.remove()
+            text.remove()
+            changed += 1
+
+        agent = env.agent
+        if agent is not None:
+            state = (agent.x, agent.y, agent.width, agent.length, agent.color, agent.item_id)
+            if self.agent_artists is None:
+                rect, text = self._add(agent)
+                self.agent_artists = (rect, text, state)
+            elif self.agent_artists[2] != state:
+                self._move(self.agent_artists[:2], agent)
+                self.agent_artists = (self.agent_artists[0], self.agent_artists[1], state)
+        return changed
+
+    def draw(self):
+        self.figure.canvas.draw()
+
+    def show(self):
+        """
+        交互模式下刷新窗口，不阻塞仿真
+        """
+        if self.offscreen:
+            self.draw()
+        else:
+            self.figure.canvas.draw_idle()
+            plt.pause(0.001)
+
+    def frame(self):
+        """
+        绘制并返回当前画面的 RGB 数组 (height, width, 3)
+        """
+        self.draw()
+        return np.asarray(self.figure.canvas.buffer_rgba())[:, :, :3].copy()
+
+    def close(self):
+        if not self.offscreen:
+            plt.close(self.figure)
+        self.artists = {}
+        self.agent_artists = None
+
+
+class FrameWriter:
+    """
+    把 SceneRenderer 的画面逐帧写出。
+
+    path 的扩展名是 .gif、.mp4 或 .avi 时写成视频（.gif 用 Pillow，其余需要 ffmpeg）；
+    否则 path 是带序号占位符的图片路径，例如 'frames/frame_%06d.png'，每帧一个文件。
+    """
+
+    def __init__(self, renderer, path, fps=10):
+        self.renderer = renderer
+        self.path = path
+        self.count = 0
+        writer_class = VIDEO_WRITERS.get(os.path.splitext(path)[1].lower())
+        self.writer = None
+        if writer_class is not None:
+            self.writer = writer_class(fps=fps)
+            self.writer.setup(renderer.figure, path, dpi=renderer.figure.dpi)
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    def write(self):
+        if self.writer is not None:
+            self.writer.grab_frame()
+        else:
+            self.renderer.figure.savefig(self.path % self.count)
+        self.count += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.finish()
+            self.writer = None
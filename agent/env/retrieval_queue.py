@@ -0,0 +1,65 @@
+import heapq
+
+
+class RetrievalQueue:
+    """
+    按 (出场时间, 时间余量, x) 排序的物品堆，堆顶就是下一个要抽取的物品。
+
+    与 get_earliest_item 原来的规则一致：先取出场时间最早的，再取时间余量最小的，再取 x 最小的，
+    全部相同时按放入场地的先后顺序。删除采用惰性方式：只从 _entries 中去掉，
+    等它浮到堆顶时再弹出，因此插入、删除、查询都是 O(log n)。
+
+    键与 WarehouseEnvironment.items 的键一致，必须和 items 字典同步增删。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}  # key -> 当前有效的登记顺序
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, key, item):
+        self._counter += 1
+        self._entries[key] = self._counter
+        heapq.heappush(self._heap, (item.exit_time, item.time_remain, item.x, self._counter, key, item))
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+        # 失效的条目太多时重建一次堆，避免反复搬动的物品让堆无限增长
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap if self._entries.get(entry[4]) == entry[3]]
+            heapq.heapify(self._heap)
+
+    def clear(self):
+        self._heap.clear()
+        self._entries.clear()
+
+    def snapshot(self):
+        return self._heap[:], dict(self._entries), self._counter
+
+    def restore(self, snapshot):
+        heap, entries, self._counter = snapshot
+        self._heap = heap[:]
+        self._entries = dict(entries)
+
+    def peek(self):
+        """
+        返回下一个要抽取的物品，没有物品时返回 None。
+        """
+        heap = self._heap
+        while heap:
+            entry = heap[0]
+            if self._entries.get(entry[4]) == entry[3]:
+                return entry[5]
+            heapq.heappop(heap)
+        return None
+
+    def smallest(self, k):
+        """
+        按抽取顺序返回排在最前面的 k 个物品（不弹出）。
+        """
+        stale = len(self._heap) - len(self._entries)
+        return [entry[5] for entry in heapq.nsmallest(k + stale, self._heap)
+                if self._entries.get(entry[4]) == entry[3]][:k]
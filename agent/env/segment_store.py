@@ -0,0 +1,148 @@
+import numpy as np
+
+from env.sim_time import SECONDS_PER_DAY, parse_time
+
+SEGMENT_DTYPE = np.dtype([
+    ('id_index', np.int32),  # 分段 ID 在 ids 中的下标
+    ('x', np.int32),
+    ('y', np.int32),
+    ('length', np.int32),  # 分段长
+    ('width', np.int32),  # 分段宽
+    ('start_day', np.int32),  # 最早开工时间（日序数）
+    ('exit_day', np.int32),  # 最早出场时间（日序数）
+    ('processing_time', np.int32),  # 加工周期
+    ('time_remain', np.int32),  # 时间余量
+    ('color_index', np.int16),  # 颜色在 colors 中的下标
+])
+
+
+class SegmentView:
+    """
+    SegmentStore 中一行的只读视图，属性与 Item 相同，只保存 store 和行号。
+    """
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def _field(self, name):
+        return int(self.store.data[name][self.row])
+
+    @property
+    def item_id(self):
+        return self.store.ids[self._field('id_index')]
+
+    @property
+    def x(self):
+        return self._field('x')
+
+    @property
+    def y(self):
+        return self._field('y')
+
+    @property
+    def length(self):
+        return self._field('length')
+
+    @property
+    def width(self):
+        return self._field('width')
+
+    @property
+    def start_time(self):
+        return self._field('start_day') * SECONDS_PER_DAY
+
+    @property
+    def exit_time(self):
+        return self._field('exit_day') * SECONDS_PER_DAY
+
+    @property
+    def processing_time(self):
+        return self._field('processing_time')
+
+    @property
+    def time_remain(self):
+        return self._field('time_remain')
+
+    @property
+    def color(self):
+        return self.store.colors[self._field('color_index')]
+
+    def get_rectangle(self):
+        left = self.x
+        top = self.y
+        return left, top, left + self.width, top + self.length
+
+
+class SegmentStore:
+    """
+    分段的紧凑存储：所有字段放在一个 NumPy 结构化数组中，每个分段只占一行。
+    分段 ID 和颜色字符串只保存一份，行中存下标；日期保存为日序数。
+    释放的行会被复用，因此反复进出的分段不会让数组无限增长。
+    """
+
+    def __init__(self, capacity=64):
+        self.data = np.zeros(capacity, dtype=SEGMENT_DTYPE)
+        self.ids = []
+        self.colors = []
+        self._id_index = {}
+        self._color_index = {}
+        self._free = []
+        self._size = 0  # 已经使用过的行数（含已释放的行）
+
+    def __len__(self):
+        return self._size - len(self._free)
+
+    def _intern(self, value, values, index):
+        position = index.get(value)
+        if position is None:
+            position = len(values)
+            values.append(value)
+            index[value] = position
+        return position
+
+    def append(self, item_id, x, y, length, width, start_time, processing_time, exit_time, time_remain,
+               color='black'):
+        """
+        添加一个分段，日期为 '%Y/%m/%d' 字符串或仿真时钟的整数秒，按天保存，返回行号。
+        """
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._size == len(self.data):
+                data = np.zeros(2 * len(self.data), dtype=SEGMENT_DTYPE)
+                data[:self._size] = self.data
+                self.data = data
+            row = self._size
+            self._size += 1
+        record = self.data[row:row + 1]
+        record['id_index'] = self._intern(item_id, self.ids, self._id_index)
+        record['x'] = x
+        record['y'] = y
+        record['length'] = length
+        record['width'] = width
+        record['start_day'] = parse_time(start_time) // SECONDS_PER_DAY
+        record['exit_day'] = parse_time(exit_time) // SECONDS_PER_DAY
+        record['processing_time'] = processing_time
+        record['time_remain'] = time_remain
+        record['color_index'] = self._intern(color, self.colors, self._color_index)
+        return row
+
+    def free(self, row):
+        """
+        释放一行，之后的 append 会复用它。
+        """
+        self._free.append(row)
+
+    def snapshot(self):
+        # ids 和 colors 只会追加，已有的下标始终有效，不需要保存
+        return self.data.copy(), self._free[:], self._size
+
+    def restore(self, snapshot):
+        data, free, self._size = snapshot
+        self.data = data.copy()
+        self._free = free[:]
+
+    def view(self, row):
+        return SegmentView(self, row)
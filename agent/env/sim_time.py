@@ -0,0 +1,35 @@
+from datetime import date, datetime, timedelta
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def parse_time(value):
+    """
+    把日期转换成仿真时钟使用的整数秒（从公元 1 年 1 月 1 日算起）。
+
+    参数：
+    - value: '%Y/%m/%d' 字符串、datetime，或者已经转换好的整数
+
+    返回：
+    - 整数秒
+    """
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y/%m/%d').toordinal() * SECONDS_PER_DAY
+    if isinstance(value, datetime):
+        return value.toordinal() * SECONDS_PER_DAY + value.hour * 3600 + value.minute * 60 + value.second
+    return value
+
+
+def format_date(value):
+    """
+    整数秒 -> 与 CSV 中相同格式的日期字符串，例如 '2024/4/26'
+    """
+    d = date.fromordinal(value // SECONDS_PER_DAY)
+    return f"{d.year}/{d.month}/{d.day}"
+
+
+def to_datetime(value):
+    """
+    整数秒 -> datetime，只在打印和写文件时使用
+    """
+    return datetime.fromordinal(value // SECONDS_PER_DAY) + timedelta(seconds=value % SECONDS_PER_DAY)
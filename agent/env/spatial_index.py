@@ -0,0 +1,163 @@
+from bisect import bisect_left, bisect_right
+
+
+class _Row:
+    """
+    场地中的一行：按 x 排序的物品列表。
+    xs 与 items 一一对应，max_width 为该行出现过的最大分段宽，用来限定区间查询的回溯范围。
+    """
+    __slots__ = ('xs', 'items', 'max_width')
+
+    def __init__(self):
+        self.xs = []
+        self.items = []
+        self.max_width = 0
+
+
+class RowIndex:
+    """
+    按行分桶的空间索引。
+
+    行以放置时的 y 坐标为键，行内物品按 x 有序保存，行号本身也保存在有序列表中，
+    因此“某行的物品”、“某行最右侧的物品”、“与矩形相交的物品”、“越过道路边界的物品”
+    都可以通过二分查找完成，而不必遍历 WarehouseEnvironment.items 中的全部物品。
+
+    索引的键与 WarehouseEnvironment.items 的键一致，都是放入场地时的 (x, y)，
+    所以必须和 items 字典同步增删。
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._ys = []
+        self._max_length = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key, item):
+        x, y = key
+        row = self._rows.get(y)
+        if row is None:
+            row = _Row()
+            self._rows[y] = row
+            self._ys.insert(bisect_left(self._ys, y), y)
+        i = bisect_right(row.xs, x)
+        row.xs.insert(i, x)
+        row.items.insert(i, item)
+        row.max_width = max(row.max_width, item.width)
+        # 最大分段长只增不减，查询时偏保守即可
+        self._max_length = max(self._max_length, item.length)
+        self._size += 1
+
+    def remove(self, key, item):
+        x, y = key
+        row = self._rows[y]
+        i = bisect_left(row.xs, x)
+        while row.items[i] is not item:
+            i += 1
+        del row.xs[i]
+        del row.items[i]
+        self._size -= 1
+        if not row.xs:
+            del self._rows[y]
+            del self._ys[bisect_left(self._ys, y)]
+
+    def clear(self):
+        self._rows.clear()
+        self._ys.clear()
+        self._max_length = 0
+        self._size = 0
+
+    def snapshot(self):
+        return ({y: (row.xs[:], row.items[:], row.max_width) for y, row in self._rows.items()},
+                self._ys[:], self._max_length, self._size)
+
+    def restore(self, snapshot):
+        rows, ys, self._max_length, self._size = snapshot
+        self._rows = {}
+        for y, (xs, items, max_width) in rows.items():
+            row = _Row()
+            row.xs = xs[:]
+            row.items = items[:]
+            row.max_width = max_width
+            self._rows[y] = row
+        self._ys = ys[:]
+
+    def items_in_row(self, y):
+        """
+        返回 y 行中的物品，按 x 从小到大排列。
+        """
+        row = self._rows.get(y)
+        if row is None:
+            return []
+        return list(row.items)
+
+    def items_near_row(self, y, tolerance=1):
+        """
+        返回 y 坐标与 y 相差不超过 tolerance 的各行中的物品。
+        """
+        ys = self._ys
+        items = []
+        for i in range(bisect_left(ys, y - tolerance), bisect_right(ys, y + tolerance)):
+            items.extend(self._rows[ys[i]].items)
+        return items
+
+    def rightmost_in_row(self, y, tolerance=0):
+        """
+        返回 y 附近各行中 x 最大的物品，没有则返回 None。
+        """
+        ys = self._ys
+        rightmost, rightmost_x = None, None
+        for i in range(bisect_left(ys, y - tolerance), bisect_right(ys, y + tolerance)):
+            row = self._rows[ys[i]]
+            if rightmost is None or row.xs[-1] > rightmost_x:
+                rightmost, rightmost_x = row.items[-1], row.xs[-1]
+        return rightmost
+
+    def candidates(self, left, top, right, bottom):
+        """
+        粗筛：返回可能与矩形 (left, top, right, bottom) 相交的物品，结果可能包含不相交的物品。
+        """
+        ys = self._ys
+        found = []
+        for i in range(bisect_right(ys, top - self._max_length), bisect_left(ys, bottom)):
+            row = self._rows[ys[i]]
+            xs = row.xs
+            lo = bisect_right(xs, left - row.max_width)
+            hi = bisect_left(xs, right)
+            found.extend(row.items[lo:hi])
+        return found
+
+    def overlapping(self, left, top, right, bottom):
+        """
+        返回与矩形 (left, top, right, bottom) 严格相交的物品，判定方式与 check_collision 相同。
+        """
+        return [item for item in self.candidates(left, top, right, bottom)
+                if left < item.x + item.width and right > item.x
+                and top < item.y + item.length and bottom > item.y]
+
+    def beyond_bounds(self, width, height):
+        """
+        返回越过道路边界的物品：x < 0、x >= width、y < 0 或者下边界 >= height。
+        """
+        ys = self._ys
+        found = []
+        lower = bisect_left(ys, 0)
+        bottom_start = bisect_left(ys, height - self._max_length)
+        for i, y in enumerate(ys):
+            row = self._rows[y]
+            xs = row.xs
+            if i < lower or y >= height:
+                found.extend(row.items)
+                continue
+            if i < bottom_start and xs[0] >= 0 and xs[-1] < width:
+                # 整行都在场地内，这是绝大多数行的情况
+                continue
+            inside = bisect_left(xs, 0)
+            outside = bisect_left(xs, width)
+            found.extend(row.items[:inside])
+            if i >= bottom_start:
+                found.extend(item for item in row.items[inside:outside] if item.y + item.length >= height)
+            found.extend(row.items[outside:])
+        return found
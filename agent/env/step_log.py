@@ -0,0 +1,114 @@
+import csv
+import time
+
+import numpy as np
+
+from env.log_files import claim, release
+
+STEP_FIELDS = ['action', 'agent_position', 'target_position', 'total_reward', 'elapsed_time', 'conflict_count']
+
+MACRO_ACTION = -1  # 二进制格式中宏动作（macro_step）的动作编号
+
+STEP_DTYPE = np.dtype([
+    ('time', np.int64),  # 仿真时间（整数秒，见 sim_time）
+    ('action', np.int8),
+    ('agent_x', np.int32),
+    ('agent_y', np.int32),
+    ('target_x', np.int32),
+    ('target_y', np.int32),
+    ('total_reward', np.float64),
+    ('elapsed_time', np.float64),
+    ('conflict_count', np.int32),
+])
+
+
+class StepLogWriter:
+    """
+    流式、只追加的步骤记录。
+
+    每一步的记录先放在内存中的一批里，达到 flush_rows 行或距离上次写出超过 flush_seconds 秒时
+    追加到文件末尾并清空这一批，所以内存占用与运行长度无关，每条记录只写一次。
+
+    格式：
+    - 'csv': 与原来 save_records_to_csv 相同的列，文件为空时先写标题行
+    - 'binary': 按 STEP_DTYPE 的定长记录直接追加，用 read_step_log 读回结构化数组
+
+    同一进程中同一时间只能有一个 StepLogWriter 写某个文件（见 log_files.claim），重复打开会抛出 ValueError。
+    """
+
+    def __init__(self, path, fmt='csv', flush_rows=1000, flush_seconds=5.0):
+        if fmt not in ('csv', 'binary'):
+            raise ValueError(f"Unknown step log format: {fmt}")
+        claim(path, self)
+        self.path = path
+        self.fmt = fmt
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.rows_written = 0
+        self._rows = []
+        self._file = None
+        self._last_flush = time.monotonic()
+
+    def __len__(self):
+        return self.rows_written + len(self._rows)
+
+    def append(self, now, action, agent_position, target_position, total_reward, elapsed_time, conflict_count):
+        self._rows.append((now, action, agent_position[0], agent_position[1], target_position[0], target_position[1],
+                           total_reward, elapsed_time, conflict_count))
+        if len(self._rows) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def extend(self, records):
+        """
+        一次追加多步的记录，records 是字段与 STEP_DTYPE 相同的结构化数组（例如 VectorWarehouseEnvironment 缓存的记录）
+        """
+        self._rows.extend(records.tolist())
+        if len(self._rows) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def _open(self):
+        # 文件只在第一次写出时打开，没有记录的环境不会创建文件
+        claim(self.path, self)
+        if self.fmt == 'csv':
+            self._file = open(self.path, mode='a', newline='')
+            self._writer = csv.writer(self._file)
+            if self._file.tell() == 0:
+                self._writer.writerow(STEP_FIELDS)
+        else:
+            self._file = open(self.path, mode='ab')
+
+    def flush(self):
+        """
+        把这一批记录追加到文件
+        """
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return
+        if self._file is None:
+            self._open()
+        if self.fmt == 'csv':
+            self._writer.writerows(
+                (action, (agent_x, agent_y), (target_x, target_y), total_reward, elapsed_time, conflict_count)
+                for _, action, agent_x, agent_y, target_x, target_y, total_reward, elapsed_time, conflict_count
+                in self._rows)
+        else:
+            records = np.array([(row[0], row[1] if isinstance(row[1], (int, np.integer)) else MACRO_ACTION) + row[2:]
+                                for row in self._rows], dtype=STEP_DTYPE)
+            records.tofile(self._file)
+        self._file.flush()
+        self.rows_written += len(self._rows)
+        self._rows.clear()
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        release(self.path, self)
+
+
+def read_step_log(path):
+    """
+    读取二进制格式的步骤记录，返回 STEP_DTYPE 结构化数组
+    """
+    return np.fromfile(path, dtype=STEP_DTYPE)
@@ -0,0 +1,113 @@
+import json
+import sys
+from collections import deque, namedtuple
+
+from env.sim_time import to_datetime
+
+DEBUG = 10  # 每一步的详细状态：场地物品、时钟、缓存、道路选择
+INFO = 20  # 拿取、搬出、冲突、移位、时钟跳转、任务完成
+WARNING = 30  # 异常和无效动作
+OFF = 100  # 安静模式：不记录任何事件
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING'}
+
+TraceEvent = namedtuple('TraceEvent', ['time', 'level', 'kind', 'fields'])
+
+
+class Tracer:
+    """
+    分级的结构化跟踪。
+
+    事件以 TraceEvent(仿真时间, 级别, 类型, 字段字典) 的形式保存在定长的环形缓冲区中，
+    字段保存原始值，只有 sink 输出时才格式化成字符串。
+
+    热路径上的调用方先比较级别再构造字段，关闭时只剩一次整数比较：
+
+        if tracer.level <= DEBUG:
+            tracer.emit(DEBUG, 'state', now, {...})
+    """
+
+    def __init__(self, level=INFO, capacity=10000, sinks=()):
+        self.level = level
+        self.buffer = deque(maxlen=capacity)
+        self.sinks = list(sinks)
+
+    @classmethod
+    def quiet(cls):
+        """
+        生产环境使用：不记录、不输出任何事件
+        """
+        return cls(level=OFF, capacity=0)
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def emit(self, level, kind, time, fields):
+        if level < self.level:
+            return
+        event = TraceEvent(time, level, kind, fields)
+        self.buffer.append(event)
+        for sink in self.sinks:
+            sink(event)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def events(self, kind=None):
+        """
+        返回缓冲区中的事件，可按类型过滤
+        """
+        if kind is None:
+            return list(self.buffer)
+        return [event for event in self.buffer if event.kind == kind]
+
+    def clear(self):
+        self.buffer.clear()
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, 'close', None)
+            if close is not None:
+                close()
+
+
+def format_event(event):
+    fields = ' '.join(f"{key}={value}" for key, value in event.fields.items())
+    return f"[{to_datetime(event.time)}] {LEVEL_NAMES.get(event.level, event.level)} {event.kind} {fields}"
+
+
+class StdoutSink:
+    """
+    把事件格式化后写到标准输出
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def __call__(self, event):
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write(format_event(event) + '\n')
+
+
+class FileSink:
+    """
+    把事件按 JSON Lines 追加写入文件，每 flush_every 条刷新一次
+    """
+
+    def __init__(self, path, flush_every=100):
+        self.file = open(path, mode='a', encoding='utf-8')
+        self.flush_every = flush_every
+        self._pending = 0
+
+    def __call__(self, event):
+        record = {'time': event.time, 'level': event.level, 'kind': event.kind}
+        record.update(event.fields)
+        self.file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.file.flush()
+            self._pending = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
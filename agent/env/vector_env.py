@@ -0,0 +1,304 @@
+import operator
+import time
+
+import numpy as np
+
+from env.step_log import STEP_DTYPE
+from env.tracing import DEBUG, WARNING
+
+
+def forward_distances(distance_x, distance_y, width, height):
+    """
+    WarehouseEnvironment.binary_forward 的批量版本。
+
+    参数：
+    - distance_x, distance_y: 每个场地中 agent 到目标位置的水平、垂直距离
+    - width, height: 每个场地的宽和高
+
+    返回：
+    - (move_x_distance, move_y_distance) 两个整数数组：离目标远时一次走 10，靠近目标时走 1
+    """
+    # binary_forward 中各个区间都是严格不等式，恰好落在 1/2、1/4、1/8 边界上时仍然只走 1
+    far_x = (distance_x > width / 16) & (distance_x != width / 2) & \
+            (distance_x != width / 4) & (distance_x != width / 8)
+    far_y = (distance_y > height / 16) & (distance_y != height / 2) & \
+            (distance_y != height / 4) & (distance_y != height / 8)
+    return np.where(far_x, 10, 1), np.where(far_y, 10, 1)
+
+
+def move_agents(actions, positions, lengths, move_x_distance, move_y_distance, width, height):
+    """
+    WarehouseEnvironment.agent_move 的批量版本，返回移动后的位置数组 (n, 2)。
+    0: 上移  1: 下移  2: 左移  3: 右移，其他动作保持不动。
+    """
+    x = positions[:, 0]
+    y = positions[:, 1]
+    # 下移时先截到 height，再保证下边界不越过 height，合起来就是截到 height - length
+    new_x = np.where(actions == 2, np.maximum(x - move_x_distance, 0),
+                     np.where(actions == 3, np.minimum(x + move_x_distance, width), x))
+    new_y = np.where(actions == 0, np.maximum(y - move_y_distance, 0),
+                     np.where(actions == 1, np.minimum(y + move_y_distance, height - lengths), y))
+    return np.stack([new_x, new_y], axis=1)
+
+
+# 缓存的步骤记录：字段与 STEP_DTYPE 相同，累计奖励保持整数，写成 CSV 时与逐步记录的格式一致
+LOG_DTYPE = np.dtype([(name, np.int64 if name == 'total_reward' else dtype)
+                      for name, (dtype, _) in STEP_DTYPE.fields.items()])
+
+
+_NO_ARRIVAL = np.iinfo(np.int64).max  # 缓存为空时的 next_arrival
+_ITEM_BOX = operator.attrgetter('x', 'y', 'width', 'length')
+
+
+def _is_int(value):
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+
+class VectorWarehouseEnvironment:
+    """
+    同时推进 N 个相互独立的场地。
+
+    每个场地的 agent 位置和尺寸、目标位置、仿真时钟、累计奖励、缓存中最早到达的时间，
+    以及场地中全部分段的矩形都保存在按场地堆叠的 NumPy 数组中。一步中对整批场地用数组运算完成：
+    移动距离和移动、缓存到达的判断、携带分段时与场地分段的相交判断、到达目标位置的判断、
+    道路上是否有分段、距离奖励、时钟推进和步骤记录。
+
+    这一步没有任何事件的场地（绝大多数）只更新数组；有事件的场地——缓存分段到达、需要选取下一个抽取的分段、
+    携带分段与其他分段相交（冲突处理）、到达目标位置（拿取、放下、搬出）、道路上有分段等——
+    把数组中的状态写回对应的 WarehouseEnvironment，调用它的 step 处理这一步，再把结果读回数组。
+    这些事件会修改 items、占据栅格、按行索引等冲突处理依赖的结构，仍由 WarehouseEnvironment 维护，
+    所以每个场地逐步得到的结果与单独调用 WarehouseEnvironment.step 完全相同。
+
+    观测与 training_env.state_array 相同：[agent_x, agent_y, target_x, target_y]。
+    某个场地 done 之后如果已经没有物品（场地和缓存都为空），会用 reset() 把该场地恢复到创建时的快照，
+    info 中的 'terminal_observation' 保存重置前的观测。
+    某个场地的 step 抛出异常时记录一条 'error' 跟踪，把该场地 reset()，这一步对该场地返回 done=True，
+    info 中的 'error' 保存异常，其他场地照常推进。
+
+    没有事件的步骤的记录先放在按 (步, 场地) 排列的结构化数组中，每 log_steps 步、
+    场地处理事件之前或者关闭时再交给各自的 StepLogWriter，记录的顺序与逐个场地运行时相同。
+
+    整批的吞吐量受有事件的步骤限制：在 segment01-min.csv 上用贪心动作（10% 随机）时约 15% 的步骤有事件，
+    每个事件步骤仍是一次完整的 step。benchmark_vector_env.py 测得 64 个场地时每个场地每步约快 1.3 倍、
+    256 个场地时约快 1.9 倍；场地很少时整批运算的固定开销反而更慢。
+    """
+
+    def __init__(self, env_fns, log_steps=256):
+        self.env_fns = list(env_fns)
+        self.envs = [env_fn() for env_fn in self.env_fns]
+        for env in self.envs:
+            env.save_initial_state()
+        self.num_envs = n = len(self.envs)
+        self.widths = np.array([env.width for env in self.envs])
+        self.heights = np.array([env.height for env in self.envs])
+        self.step_seconds = np.array([env.step_seconds for env in self.envs], dtype=np.int64)
+
+        self.positions = np.zeros((n, 2), dtype=np.int64)  # agent 的 (x, y)
+        self.targets = np.zeros((n, 2), dtype=np.int64)  # 目标位置
+        self.agent_sizes = np.zeros((n, 2), dtype=np.int64)  # agent（携带分段时就是该分段）的 (width, length)
+        self.has_item = np.zeros(n, dtype=bool)
+        self.now = np.zeros(n, dtype=np.int64)  # 仿真时钟
+        self.next_arrival = np.zeros(n, dtype=np.int64)  # 缓存中最早到达的时间，缓存为空时为 int64 最大值
+        self.total_reward = np.zeros(n, dtype=np.int64)
+        self.total_step_time = np.zeros(n)
+        self.conflict_count = np.zeros(n, dtype=np.int64)
+        # 这一步一定交给 WarehouseEnvironment 的场地：状态不能用数组表示、道路上有分段、目标位置为 (0, 0)
+        self.blocked = np.zeros(n, dtype=bool)
+        # 场地分段的矩形，每个场地一行，空位填 (inf, inf, -inf, -inf)，不与任何矩形相交
+        self.item_left = np.full((n, 0), np.inf)
+        self.item_top = np.full((n, 0), np.inf)
+        self.item_right = np.full((n, 0), -np.inf)
+        self.item_bottom = np.full((n, 0), -np.inf)
+        self.on_road = np.zeros(n, dtype=bool)  # 场地中有越过道路边界的分段，clean_on_road 会移除它
+        self.advanced = np.zeros(n, dtype=bool)  # 上次读入之后在数组中走过的场地，交给 step 之前要先写回
+        # 读入分段的矩形时占据栅格的 (最近登记顺序, 分段个数)，没有变化时不用重新读分段的矩形
+        self._layout_versions = [None] * n
+
+        self.log_steps = log_steps
+        self._log = np.zeros((log_steps, n), dtype=LOG_DTYPE)
+        self._logged = np.zeros((log_steps, n), dtype=bool)
+        self._log_len = 0
+        for index in range(n):
+            self._pull(index)
+
+    def _pull(self, index, force=False):
+        """
+        把场地 index 的状态从 WarehouseEnvironment 读到数组中。
+        分段只通过 place_item / _discard_item 进出场地，占据栅格的登记顺序和分段个数都没变时分段的矩形也没变；
+        force=True 时（场地被重置或重建）总是重新读
+        """
+        env = self.envs[index]
+        agent = env.agent
+        self.positions[index] = agent.x, agent.y
+        self.targets[index] = env.target_position
+        self.agent_sizes[index] = agent.width, agent.length
+        self.has_item[index] = env.agent_has_item
+        self.now[index] = env.clock.now
+        self.next_arrival[index] = env.cache_items[0][0] if env.cache_items else _NO_ARRIVAL
+        self.total_reward[index] = env.total_reward
+        self.total_step_time[index] = env.total_step_time
+        self.conflict_count[index] = env.conflict_count
+        self.advanced[index] = False
+        # finish_step 在下面这些情况下会修改 agent 的标记；时钟中还有登记的事件时推进时钟要弹出事件；
+        # 坐标或奖励不是整数、或者输出调试跟踪时，这一步都交给 WarehouseEnvironment
+        if env.agent_has_item:
+            relabel = len(agent.item_id) < 10
+        else:
+            relabel = agent.item_id != 'agent' or agent.color != 'yellow'
+        irregular = relabel or len(env.clock) > 0 or env.tracer.level <= DEBUG or not all(
+            map(_is_int, (agent.x, agent.y, agent.width, agent.length) + tuple(env.target_position)
+                + (env.total_reward, env.clock.now)))
+
+        version = (env.grid.last_order, len(env.grid))
+        if force or version != self._layout_versions[index]:
+            self._layout_versions[index] = version
+            self._pull_items(index)
+        self.blocked[index] = irregular or self.on_road[index] or env.target_position == (0, 0)
+
+    def _pull_items(self, index):
+        env = self.envs[index]
+        count = len(env.items)
+        if count > self.item_left.shape[1]:
+            self._grow_items(count)
+        rects = np.array([_ITEM_BOX(item) for item in env.items.values()], dtype=float).reshape(count, 4)
+        left, top = rects[:, 0], rects[:, 1]
+        right, bottom = left + rects[:, 2], top + rects[:, 3]
+        self.item_left[index, :count], self.item_left[index, count:] = left, np.inf
+        self.item_top[index, :count], self.item_top[index, count:] = top, np.inf
+        self.item_right[index, :count], self.item_right[index, count:] = right, -np.inf
+        self.item_bottom[index, :count], self.item_bottom[index, count:] = bottom, -np.inf
+        # 与 RowIndex.beyond_bounds 的规则相同
+        self.on_road[index] = bool(np.any((left < 0) | (left >= env.width) | (top < 0) | (top >= env.height)
+                                          | (bottom >= env.height)))
+
+    def _grow_items(self, count):
+        capacity = max(count, 2 * self.item_left.shape[1])
+        for name, fill in (('item_left', np.inf), ('item_top', np.inf), ('item_right', -np.inf),
+                           ('item_bottom', -np.inf)):
+            grown = np.full((self.num_envs, capacity), fill)
+            old = getattr(self, name)
+            grown[:, :old.shape[1]] = old
+            setattr(self, name, grown)
+
+    def _push(self, index):
+        """
+        把数组中场地 index 的状态写回 WarehouseEnvironment
+        """
+        env = self.envs[index]
+        env.agent.x, env.agent.y = int(self.positions[index, 0]), int(self.positions[index, 1])
+        env.clock.now = int(self.now[index])
+        env.total_reward = int(self.total_reward[index])
+        env.total_step_time = float(self.total_step_time[index])
+
+    def _flush_log(self, index=None):
+        """
+        把缓存的步骤记录交给场地 index（None 时为全部场地）的 StepLogWriter
+        """
+        indices = range(self.num_envs) if index is None else [index]
+        for i in indices:
+            logged = self._logged[:self._log_len, i]
+            if logged.any():
+                self.envs[i].step_log.extend(self._log[:self._log_len, i][logged])
+                logged[:] = False
+        if index is None:
+            self._log_len = 0
+
+    def _observations(self):
+        return np.concatenate([self.positions, self.targets], axis=1).astype(float)
+
+    def _reset_env(self, index):
+        self._flush_log(index)
+        self.envs[index].reset()
+        self._pull(index, force=True)
+
+    def reset(self):
+        for index in range(self.num_envs):
+            self._reset_env(index)
+        return self._observations()
+
+    def get_state(self):
+        return self._observations()
+
+    def close(self):
+        self._flush_log()
+        for env in self.envs:
+            env.close()
+
+    def step(self, actions):
+        """
+        每个场地执行一个动作。
+
+        参数：
+        - actions: 长度为 N 的动作数组
+
+        返回：
+        - (observations, rewards, dones, infos)，observations 形状为 (N, 4)
+        """
+        actions = np.asarray(actions)
+        started = time.perf_counter()
+        positions, targets = self.positions, self.targets
+        # 这一步开始时就能确定有事件的场地：缓存分段到达、状态不规则、需要选取抽取的分段（目标位置为 (0, 0)）等
+        events = self.blocked | (self.next_arrival <= self.now) | ((actions & -4) != 0)
+
+        distances = np.abs(positions - targets)
+        move_x_distance, move_y_distance = forward_distances(distances[:, 0], distances[:, 1],
+                                                             self.widths, self.heights)
+        moved = move_agents(actions, positions, self.agent_sizes[:, 1], move_x_distance, move_y_distance,
+                            self.widths, self.heights)
+        # 移动之后：到达目标位置，或者携带的分段与场地中的分段相交（与 check_collision 的规则相同）
+        offsets = np.abs(moved - targets)
+        events |= (offsets[:, 0] == 0) & (offsets[:, 1] == 0)
+        carrying = np.flatnonzero(self.has_item & ~events)
+        if len(carrying):
+            left, top = moved[carrying, 0, None], moved[carrying, 1, None]
+            right = left + self.agent_sizes[carrying, 0, None]
+            bottom = top + self.agent_sizes[carrying, 1, None]
+            hit = (left < self.item_right[carrying]) & (right > self.item_left[carrying]) & \
+                  (top < self.item_bottom[carrying]) & (bottom > self.item_top[carrying])
+            events[carrying] = hit.any(axis=1)
+
+        # 没有事件的场地：距离奖励、推进时钟、记录这一步
+        quiet = ~events
+        rewards = np.where(quiet & (targets[:, 0] < self.widths), 100 - offsets[:, 0] - offsets[:, 1], 0)
+        positions[quiet] = moved[quiet]
+        self.advanced |= quiet
+        self.now += np.where(quiet, self.step_seconds, 0)
+        self.total_reward += rewards
+        self.total_step_time += np.where(quiet, (time.perf_counter() - started) / self.num_envs, 0)
+        if self._log_len == self.log_steps:
+            self._flush_log()
+        row = self._log[self._log_len]
+        row['time'] = self.now
+        row['action'] = actions
+        row['agent_x'], row['agent_y'] = positions[:, 0], positions[:, 1]
+        row['target_x'], row['target_y'] = targets[:, 0], targets[:, 1]
+        row['total_reward'] = self.total_reward
+        row['elapsed_time'] = self.total_step_time.round(5)
+        row['conflict_count'] = self.conflict_count
+        self._logged[self._log_len] = quiet
+        self._log_len += 1
+
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = [{} for _ in range(self.num_envs)]
+        # 有事件的场地按编号顺序交给 WarehouseEnvironment，随机选择冲突处理方式时与逐个场地运行的顺序一致
+        for index in np.flatnonzero(events):
+            env = self.envs[index]
+            self._flush_log(index)
+            if self.advanced[index]:
+                self._push(index)
+            try:
+                _, reward, done, infos[index] = env.step(actions[index].item())
+            except Exception as e:
+                env.trace(WARNING, 'error', where='step', error=repr(e))
+                rewards[index] = 0
+                dones[index] = True
+                infos[index] = {'error': e, 'terminal_observation': self._observations()[index]}
+                self._reset_env(index)
+                continue
+            self._pull(index)
+            rewards[index] = reward
+            dones[index] = done
+            if done and not env.items and not env.cache_items:
+                infos[index]['terminal_observation'] = self._observations()[index]
+                self._reset_env(index)
+        return self._observations(), rewards, dones, infos
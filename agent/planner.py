@@ -0,0 +1,148 @@
+import time
+from collections import namedtuple
+
+from env.tracing import Tracer
+
+CONFLICT = 'conflict'  # 冲突处理方式的选择，候选为 handle_conflict_1/2/3
+RETRIEVAL = 'retrieval'  # 抽取哪一个到期物品，候选按 retrieval_queue 的顺序排列
+
+Plan = namedtuple('Plan', ['decisions', 'remaining', 'relocations', 'travel', 'evaluated'])
+
+_Node = namedtuple('_Node', ['decisions', 'points', 'failed', 'remaining', 'relocations', 'travel'])
+
+
+class _NullLog:
+    """
+    试算时代替 step_log 和 exit_journal，不写任何文件
+    """
+
+    def append(self, *args):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ScriptedPolicy:
+    """
+    按给定的决策序列依次做决策（每个决策是候选列表中的下标），序列用完后总是选第一个候选：
+    抽取时即原来的贪心顺序，冲突时即 handle_conflict_1。
+
+    同时记录实际遇到的决策点 [(类型, 候选个数)] 和处理冲突的次数。
+    """
+
+    def __init__(self, decisions=()):
+        self.decisions = list(decisions)
+        self.position = 0
+        self.points = []
+        self.relocations = 0
+
+    @property
+    def exhausted(self):
+        return self.position >= len(self.decisions)
+
+    def _next(self, kind, count):
+        self.points.append((kind, count))
+        if self.exhausted:
+            return 0
+        option = self.decisions[self.position]
+        self.position += 1
+        return min(option, count - 1)
+
+    def choose_conflict(self, env, other_item, handlers):
+        self.relocations += 1
+        return handlers[self._next(CONFLICT, len(handlers))]
+
+    def choose_retrieval(self, env, candidates):
+        return candidates[self._next(RETRIEVAL, len(candidates))]
+
+
+class BeamSearchPlanner:
+    """
+    抽取顺序和冲突处理方式的前瞻规划（束搜索）。
+
+    一个候选方案是决策序列的前缀，评估方法是从当前状态的快照出发，按前缀做决策、之后按默认决策，
+    用 macro_step 向前模拟 horizon 步，统计视野结束时还没有搬出的分段数、处理冲突（移位）的次数和 agent 移动的总距离。
+    每一轮把束中每个方案在下一个决策点上展开成各个候选，按 (是否出错, 剩余分段数, 移位次数, 移动距离) 保留最好的
+    beam_width 个：先保证搬出的分段一样多，再比较移位次数和移动距离，原地空转的方案不会因为不移动而被选中。
+    time_budget 秒用完时返回目前最好的方案。规划结束后场地恢复到规划前的状态。
+    """
+
+    def __init__(self, beam_width=4, horizon=40, time_budget=0.2):
+        self.beam_width = beam_width
+        self.horizon = horizon
+        self.time_budget = time_budget
+
+    @staticmethod
+    def _cost(node):
+        return node.failed, node.remaining, node.relocations, node.travel
+
+    def _evaluate(self, env, root, decisions):
+        env.restore(root)
+        policy = ScriptedPolicy(decisions)
+        env.decision_policy = policy
+        failed = False
+        travel = 0
+        for _ in range(self.horizon):
+            if not env.items and not env.cache_items and env.target_position == (0, 0):
+                break
+            try:
+                _, _, _, info = env.macro_step()
+            except Exception:
+                # 模拟出错的方案排在所有正常方案之后
+                failed = True
+                break
+            travel += info['distance']
+        remaining = len(env.items) + len(env.cache_items) + len(env.interfering_items)
+        return _Node(list(decisions), policy.points, failed, remaining, policy.relocations, travel)
+
+    def plan(self, env):
+        """
+        从 env 的当前状态（两次 step 之间）开始规划，返回 Plan；env 的状态不变
+        """
+        deadline = time.perf_counter() + self.time_budget
+        root = env.snapshot()
+        saved = env.tracer, env.step_log, env.exit_journal, env.decision_policy
+        env.tracer, env.step_log, env.exit_journal = Tracer.quiet(), _NullLog(), _NullLog()
+        evaluated = 1
+        try:
+            best = self._evaluate(env, root, [])
+            beam = [best]
+            while beam and time.perf_counter() < deadline:
+                children = []
+                for node in beam:
+                    depth = len(node.decisions)
+                    if depth >= len(node.points):
+                        # 视野内没有更多的决策点
+                        continue
+                    _, count = node.points[depth]
+                    # 选第一个候选与默认决策相同，直接沿用当前方案的评估结果
+                    children.append(node._replace(decisions=node.decisions + [0]))
+                    for option in range(1, count):
+                        if time.perf_counter() >= deadline:
+                            break
+                        children.append(self._evaluate(env, root, node.decisions + [option]))
+                        evaluated += 1
+                if not children:
+                    break
+                children.sort(key=self._cost)
+                beam = children[:self.beam_width]
+                if self._cost(beam[0]) < self._cost(best):
+                    best = beam[0]
+        finally:
+            env.restore(root)
+            env.tracer, env.step_log, env.exit_journal, env.decision_policy = saved
+        return Plan(best.decisions, best.remaining, best.relocations, best.travel, evaluated)
+
+
+def planned_macro_step(env, planner):
+    """
+    带规划的宏动作：上一次规划的决策用完时重新规划，然后按规划执行一次 macro_step
+    """
+    policy = env.decision_policy
+    if not isinstance(policy, ScriptedPolicy) or policy.exhausted:
+        env.decision_policy = ScriptedPolicy(planner.plan(env).decisions)
+    return env.macro_step()
@@ -0,0 +1,310 @@
+import time
+from collections import namedtuple
+
+RETRIEVE = 'retrieve'  # 把分段从场地搬到道路上出场
+RELOCATE = 'relocate'  # 把挡路的分段移到另一行（或放回原行）的道路一侧
+HOLD = 'hold'  # 其他行都放不下时，把挡路的分段暂存到道路边，之后放回原行
+
+Move = namedtuple('Move', ['kind', 'item_id', 'source', 'destination'])
+
+Schedule = namedtuple('Schedule', ['moves', 'relocations', 'lower_bound', 'optimal', 'nodes', 'elapsed'])
+
+_INFINITY = float('inf')
+
+
+class _Yard:
+    """
+    求解用的场地模型：每一行是一个栈，栈底是 x 最小的分段，栈顶是最靠近右侧道路的分段。
+    分段只用下标表示，priority 越小越早出场；不在出场清单中的分段优先级最低，只会挡路、不会被搬出。
+    """
+
+    def __init__(self, env, until, row_slack):
+        if not env.tag_right:
+            raise ValueError("Relocation solver only supports yards with a right-hand road")
+        if env.layout_dirty:
+            env.rebuild_layout()
+        # 右侧道路在场地之外，从 x = env.width 开始（与 draw_road、choose_road 一致）
+        self.road_x = env.width
+        self.width = env.width
+        self.row_slack = row_slack
+
+        heights = dict(zip(env.y_positions, env.segment_heights))
+        items = sorted(env.items.values(), key=lambda item: (item.y, item.x))
+        for item in items:
+            # 被移动过的分段可能不在 y_positions 上，按该行最长的分段估计行高
+            heights[item.y] = max(heights.get(item.y, 0), item.length)
+        self.ys = sorted(heights)
+        self.heights = [heights[y] for y in self.ys]
+        row_of_y = {y: row for row, y in enumerate(self.ys)}
+
+        self.items = items
+        self.xs = [item.x for item in items]
+        keys = sorted({(item.exit_time, item.time_remain) for item in items
+                       if until is None or item.exit_time <= until})
+        rank = {key: index for index, key in enumerate(keys)}
+        self.last = len(keys)  # 不出场的分段的优先级
+        self.priority = [rank.get((item.exit_time, item.time_remain), self.last) for item in items]
+        self.targets = sum(1 for p in self.priority if p < self.last)
+        self.stacks = [[] for _ in self.ys]
+        for index, item in enumerate(items):
+            self.stacks[row_of_y[item.y]].append(index)
+
+    def fits(self, index, row):
+        item = self.items[index]
+        if not 0 <= self.heights[row] - item.length <= self.row_slack:
+            return False
+        return self.top_x(row) + item.width <= self.road_x
+
+    def top_x(self, row):
+        """
+        放到该行道路一侧的分段的 x 坐标，与 check_item 的放置规则一致
+        """
+        stack = self.stacks[row]
+        if not stack:
+            return 1
+        top = stack[-1]
+        return self.xs[top] + self.items[top].width + 1
+
+    def position(self, index, row):
+        return self.xs[index], self.ys[row]
+
+
+class BlockRelocationSolver:
+    """
+    出场清单的离线求解：给定场地中的分段布局和出场顺序，求移位次数最少的抽取方案（block relocation problem）。
+
+    每一行是一个栈，只能从道路一侧取分段。出场顺序按 (exit_time, time_remain) 排列，相同的可以按任意顺序出场；
+    until 之后出场的分段不在清单中，只作为挡路的分段。采用受限模型：只移动压在下一个要出场的分段上面的分段，
+    移到其他行的道路一侧，目标行的行高要与分段长度匹配（与入场时 find_row(length, row_slack) 相同）且不能越过道路；
+    其他行都放不下时，像 interfering_items 那样暂存到道路边，出场分段搬出后按原顺序放回本行。每个移走的分段计一次移位。
+
+    深度优先的分支定界，子节点按“移过去之后不再挡路且最紧凑”的顺序展开，第一次下潜就是贪心解。
+    下界是挡路分段的个数（每个挡路的分段至少移一次），再加上下一个出场分段上方那些找不到不挡路的行、
+    必然还要再移一次的分段数。node_limit 或 time_limit 用完时返回目前最好的方案。
+    """
+
+    def __init__(self, node_limit=200000, time_limit=5.0, row_slack=4):
+        self.node_limit = node_limit
+        self.time_limit = time_limit
+        self.row_slack = row_slack
+
+    def solve(self, env, until=None):
+        """
+        对 env 当前的场地求解，until 为出场清单的截止时间（整数秒，包含），None 表示场地中的全部分段。
+        返回 Schedule，env 不变
+        """
+        start = time.perf_counter()
+        yard = _Yard(env, until, self.row_slack)
+        self._yard = yard
+        self._deadline = start + self.time_limit
+        self._nodes = 0
+        self._stopped = False
+        self._path = []
+        self._best = None
+        self._best_relocations = _INFINITY
+        root_bound = self._lower_bound()
+        self._search(0, yard.targets)
+        self._yard = None
+        if self._best is None:
+            raise ValueError("No feasible retrieval schedule within the limits")
+        optimal = not self._stopped or self._best_relocations == root_bound
+        return Schedule(self._best, self._best_relocations, root_bound, optimal, self._nodes,
+                        time.perf_counter() - start)
+
+    def _min_priority(self, row):
+        priority = self._yard.priority
+        return min((priority[index] for index in self._yard.stacks[row]), default=_INFINITY)
+
+    def _lower_bound(self):
+        yard = self._yard
+        priority = yard.priority
+        bound = 0
+        next_priority = _INFINITY
+        for stack in yard.stacks:
+            lowest = _INFINITY
+            for index in stack:
+                if priority[index] > lowest:
+                    bound += 1
+                else:
+                    lowest = priority[index]
+            if lowest < next_priority:
+                next_priority = lowest
+        if next_priority >= yard.last:
+            return bound
+
+        # 下一个出场的分段唯一时，它上面的每个分段都要移走；如果没有最小优先级不小于它的行可去，
+        # 移过去之后仍然挡路，至少还要再移一次。往别的行放分段只会让这些行的最小优先级变小，所以这个判断不会高估
+        rows = [row for row, stack in enumerate(yard.stacks) if any(priority[i] == next_priority for i in stack)]
+        if len(rows) != 1 or sum(1 for p in priority if p == next_priority) != 1:
+            return bound
+        row = rows[0]
+        stack = yard.stacks[row]
+        target = next(depth for depth, index in enumerate(stack) if priority[index] == next_priority)
+        # 可去的行包括暂存后放回的本行，放回时压在出场分段下面的那些分段上
+        others = [self._min_priority(other) for other in range(len(yard.stacks)) if other != row]
+        others.append(min((priority[index] for index in stack[:target]), default=_INFINITY))
+        best_other = max(others)
+        for index in stack[target + 1:]:
+            if best_other < priority[index]:
+                bound += 1
+        return bound
+
+    def _out_of_budget(self):
+        if self._nodes >= self.node_limit or (self._nodes % 256 == 0 and time.perf_counter() >= self._deadline):
+            self._stopped = True
+        return self._stopped
+
+    def _retrieve_free(self, remaining):
+        """
+        把已经在栈顶、优先级最小的分段直接搬出，返回搬出后的剩余数和搬出的 (行, 分段) 列表
+        """
+        yard = self._yard
+        priority = yard.priority
+        retrieved = []
+        while remaining:
+            next_priority = min(self._min_priority(row) for row in range(len(yard.stacks)))
+            for row, stack in enumerate(yard.stacks):
+                if stack and priority[stack[-1]] == next_priority:
+                    index = stack.pop()
+                    retrieved.append((row, index))
+                    self._path.append(Move(RETRIEVE, yard.items[index].item_id, yard.position(index, row),
+                                           (yard.width, yard.ys[row])))
+                    remaining -= 1
+                    break
+            else:
+                break
+        return remaining, retrieved
+
+    def _children(self):
+        """
+        可以展开的移位 (源行, 目标行)，按优先顺序排列；目标行等于源行表示暂存后放回原行
+        """
+        yard = self._yard
+        priority = yard.priority
+        minimums = [self._min_priority(row) for row in range(len(yard.stacks))]
+        next_priority = min(minimums)
+        children = []
+        for source, stack in enumerate(yard.stacks):
+            if minimums[source] != next_priority:
+                continue
+            moving = stack[-1]
+            count = len(children)
+            for destination in range(len(yard.stacks)):
+                if destination == source or not yard.fits(moving, destination):
+                    continue
+                lowest = minimums[destination]
+                if lowest >= priority[moving]:
+                    # 不再挡路，优先选最小优先级最接近的行，把宽松的行留给之后的分段
+                    key = (0, lowest)
+                else:
+                    key = (1, -lowest)
+                children.append((key, source, destination))
+            if len(children) == count:
+                # 其他行都放不下，只能像 interfering_items 那样暂存在道路边，搬出后放回原行
+                children.append(((2, 0), source, source))
+        children.sort()
+        return [(source, destination) for _, source, destination in children]
+
+    def _relocate(self, source, destination, relocations, remaining):
+        yard = self._yard
+        index = yard.stacks[source].pop()
+        old_x = yard.xs[index]
+        new_x = yard.top_x(destination)
+        yard.stacks[destination].append(index)
+        yard.xs[index] = new_x
+        self._path.append(Move(RELOCATE, yard.items[index].item_id, (old_x, yard.ys[source]),
+                               (new_x, yard.ys[destination])))
+        self._search(relocations + 1, remaining)
+        self._path.pop()
+        yard.xs[index] = old_x
+        yard.stacks[destination].pop()
+        yard.stacks[source].append(index)
+
+    def _hold_and_return(self, row, relocations, remaining):
+        """
+        把最上面的出场分段之上的分段依次暂存到道路边，搬出出场分段，再按原来的顺序放回本行
+        """
+        yard = self._yard
+        stack = yard.stacks[row]
+        priority = yard.priority
+        next_priority = min(priority[index] for index in stack)
+        depth = max(depth for depth, index in enumerate(stack) if priority[index] == next_priority)
+        held = stack[depth + 1:]
+        target = stack[depth]
+        old_xs = [yard.xs[index] for index in held]
+        road = (yard.width, yard.ys[row])
+        path_length = len(self._path)
+        for index in reversed(held):
+            self._path.append(Move(HOLD, yard.items[index].item_id, yard.position(index, row), road))
+        self._path.append(Move(RETRIEVE, yard.items[target].item_id, yard.position(target, row), road))
+        del stack[depth:]
+        for index in held:
+            yard.xs[index] = yard.top_x(row)
+            stack.append(index)
+            self._path.append(Move(RELOCATE, yard.items[index].item_id, road, yard.position(index, row)))
+        self._search(relocations + len(held), remaining - 1)
+        del stack[depth:]
+        stack.append(target)
+        stack.extend(held)
+        for index, old_x in zip(held, old_xs):
+            yard.xs[index] = old_x
+        del self._path[path_length:]
+
+    def _search(self, relocations, remaining):
+        remaining, retrieved = self._retrieve_free(remaining)
+        if remaining == 0:
+            if relocations < self._best_relocations:
+                self._best_relocations = relocations
+                self._best = list(self._path)
+        elif relocations + self._lower_bound() < self._best_relocations and not self._out_of_budget():
+            for source, destination in self._children():
+                if self._out_of_budget():
+                    break
+                self._nodes += 1
+                if source == destination:
+                    self._hold_and_return(source, relocations, remaining)
+                else:
+                    self._relocate(source, destination, relocations, remaining)
+                if relocations + self._lower_bound() >= self._best_relocations:
+                    # 子节点找到了更好的方案，剩下的子节点已经不可能改进
+                    break
+        for row, index in reversed(retrieved):
+            self._yard.stacks[row].append(index)
+            self._path.pop()
+
+
+def task_stack(schedule):
+    """
+    把方案导出为 env.task_positions 的格式：每一步依次访问源位置和目标位置（出场和暂存的目标是道路），
+    列表末尾是第一个任务，与 task_positions.pop(-1) 的取法一致
+    """
+    positions = []
+    for move in schedule.moves:
+        positions.append(move.source)
+        positions.append(move.destination)
+    positions.reverse()
+    return positions
+
+
+def replay(env, schedule):
+    """
+    在 env 中按方案执行：移位的分段放到新位置，暂存的分段先从场地中取出，出场的分段从场地中移除并写入出场记录。
+    只改变场地布局，不模拟 agent 的移动和时间
+    """
+    held = {}
+    for move in schedule.moves:
+        if move.item_id in held:
+            item = held.pop(move.item_id)
+        else:
+            item = env.items[move.source]
+            if item.item_id != move.item_id:
+                raise ValueError(f"Expected {move.item_id} at {move.source}, found {item.item_id}")
+            env.remove_item(item)
+        if move.kind == RETRIEVE:
+            env.out_list.append(item)
+            env.out_listed()
+        elif move.kind == HOLD:
+            held[item.item_id] = item
+        else:
+            item.x, item.y = move.destination
+            env.place_item(item)
@@ -0,0 +1,301 @@
+import json
+import os
+
+import numpy as np
+
+
+def state_row(state, state_size):
+    """
+    把一个状态（(state_size,) 或 (1, state_size) 的数组）变成一行，元素个数不是 state_size 时抛出 ValueError
+    """
+    state = np.asarray(state, dtype=np.float32)
+    if state.size != state_size:
+        raise ValueError(f"Expected a state with {state_size} values, got shape {state.shape}")
+    return state.reshape(state_size)
+
+
+class SumTree:
+    """
+    优先级的求和树，叶子数向上取到 2 的幂，tree[1] 是所有优先级的和。
+    更新和按前缀和查找都对一批下标一次完成，复杂度 O(batch * log capacity)。
+    """
+
+    def __init__(self, capacity):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices) + self.size
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        """
+        返回前缀和落在 values 处的叶子下标
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.size:
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values >= left_sum
+            values = np.where(go_right, values - left_sum, values)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.size
+
+    def get(self, indices):
+        return self.tree[np.asarray(indices) + self.size]
+
+
+class ReplayBuffer:
+    """
+    经验回放的环形缓冲区，state、action、reward、next_state、done 各自保存在预先分配的 NumPy 数组中，
+    写满后覆盖最旧的经验。sample 对整批下标做一次索引，直接得到训练用的批次数组。
+
+    prioritized=True 时按 |TD 误差| 的 alpha 次方成比例抽样（求和树），
+    并返回重要性采样权重；否则均匀抽样，权重全为 1。
+    """
+
+    def __init__(self, capacity, state_size, prioritized=False, alpha=0.6, beta=0.4, priority_epsilon=1e-6):
+        self.capacity = capacity
+        self.state_size = state_size
+        self.states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.position = 0  # 下一条经验写入的位置
+        self.count = 0
+
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.priority_epsilon = priority_epsilon
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity) if prioritized else None
+
+    def __len__(self):
+        return self.count
+
+    def add(self, state, action, reward, next_state, done):
+        index = self.position
+        self.states[index] = state_row(state, self.state_size)
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.next_states[index] = state_row(next_state, self.state_size)
+        self.dones[index] = done
+        if self.prioritized:
+            # 新经验使用目前最大的优先级，保证至少被抽到一次
+            self.tree.update([index], self.max_priority)
+        self.position = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        返回：
+        - (states, actions, rewards, next_states, dones, indices, weights)
+        """
+        if self.prioritized:
+            # 分层抽样：把总优先级平均分成 batch_size 段，每段抽一个
+            total = self.tree.total
+            values = (np.arange(batch_size) + np.random.rand(batch_size)) * (total / batch_size)
+            indices = np.minimum(self.tree.find(values), self.count - 1)
+            probabilities = self.tree.get(indices) / total
+            weights = (self.count * probabilities) ** -self.beta
+            weights = (weights / weights.max()).astype(np.float32)
+        else:
+            indices = np.random.randint(0, self.count, size=batch_size)
+            weights = np.ones(batch_size, dtype=np.float32)
+        return (self.states[indices], self.actions[indices], self.rewards[indices], self.next_states[indices],
+                self.dones[indices], indices, weights)
+
+    def update_priorities(self, indices, td_errors):
+        if not self.prioritized:
+            return
+        priorities = (np.abs(td_errors) + self.priority_epsilon) ** self.alpha
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities)
+
+    def state_dict(self):
+        """
+        已写入部分的数组副本，用于写检查点
+        """
+        count = self.count
+        return {
+            'states': self.states[:count].copy(),
+            'actions': self.actions[:count].copy(),
+            'rewards': self.rewards[:count].copy(),
+            'next_states': self.next_states[:count].copy(),
+            'dones': self.dones[:count].copy(),
+            'position': self.position,
+            'max_priority': self.max_priority,
+            'tree': self.tree.tree.copy() if self.prioritized else None,
+        }
+
+    def load_state_dict(self, state):
+        count = min(len(state['actions']), self.capacity)
+        self.states[:count] = state['states'][:count]
+        self.actions[:count] = state['actions'][:count]
+        self.rewards[:count] = state['rewards'][:count]
+        self.next_states[:count] = state['next_states'][:count]
+        self.dones[:count] = state['dones'][:count]
+        self.count = count
+        self.position = state['position'] % self.capacity
+        self.max_priority = state['max_priority']
+        if self.prioritized:
+            if state['tree'] is not None and len(state['tree']) == len(self.tree.tree):
+                self.tree.tree[:] = state['tree']
+            else:
+                self.tree.update(np.arange(count), self.max_priority)
+
+
+def transition_dtype(state_size):
+    return np.dtype([
+        ('state', np.float32, (state_size,)),
+        ('action', np.int32),
+        ('reward', np.float32),
+        ('next_state', np.float32, (state_size,)),
+        ('done', np.float32),
+    ])
+
+
+class MemmapReplayBuffer:
+    """
+    保存在磁盘上的经验回放，用于特别长的训练。
+
+    经验按顺序追加到 directory 下定长的段文件（.npy 格式的 numpy.memmap）中，一段写满再新建一段；
+    设置 max_segments 时删除最旧的一段。抽样直接从映射中按下标读取，经验留在页缓存中而不是 Python 堆上。
+    meta.json 记录段号和最后一段已写入的条数，每 flush_every 条经验以及 close 时原子地更新，
+    重新打开同一个目录就能接着使用之前的经验。
+
+    只支持均匀抽样，sample 的返回值与 ReplayBuffer 相同。
+    """
+
+    def __init__(self, directory, state_size, segment_size=100000, max_segments=None, flush_every=1000):
+        self.directory = directory
+        self.state_size = state_size
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.flush_every = flush_every
+        self.dtype = transition_dtype(state_size)
+        self.segments = []  # [(段号, memmap)]
+        self.fill = 0  # 最后一段中已写入的条数
+        self._unflushed = 0
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self._meta_path()):
+            self._load()
+
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"segment_{number:06d}.npy")
+
+    def _load(self):
+        with open(self._meta_path(), 'r') as file:
+            meta = json.load(file)
+        if meta['state_size'] != self.state_size or meta['segment_size'] != self.segment_size:
+            raise ValueError(f"Replay directory {self.directory} was created with state_size={meta['state_size']}, "
+                             f"segment_size={meta['segment_size']}")
+        self.segments = [(number, np.lib.format.open_memmap(self._segment_path(number), mode='r+'))
+                         for number in meta['segments']]
+        self.fill = meta['fill']
+
+    def _save_meta(self):
+        meta = {
+            'state_size': self.state_size,
+            'segment_size': self.segment_size,
+            'segments': [number for number, _ in self.segments],
+            'fill': self.fill,
+        }
+        tmp_path = self._meta_path() + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, self._meta_path())
+
+    def __len__(self):
+        if not self.segments:
+            return 0
+        return (len(self.segments) - 1) * self.segment_size + self.fill
+
+    def _new_segment(self):
+        number = 0
+        if self.segments:
+            # 写满的一段不会再改动，写回磁盘后只用于抽样
+            self.segments[-1][1].flush()
+            number = self.segments[-1][0] + 1
+        segment = np.lib.format.open_memmap(self._segment_path(number), mode='w+', dtype=self.dtype,
+                                             shape=(self.segment_size,))
+        self.segments.append((number, segment))
+        self.fill = 0
+        if self.max_segments is not None and len(self.segments) > self.max_segments:
+            old_number, old_segment = self.segments.pop(0)
+            del old_segment
+            os.remove(self._segment_path(old_number))
+        self.flush()
+
+    def add(self, state, action, reward, next_state, done):
+        if not self.segments or self.fill == self.segment_size:
+            self._new_segment()
+        segment = self.segments[-1][1]
+        index = self.fill
+        segment['state'][index] = state_row(state, self.state_size)
+        segment['action'][index] = action
+        segment['reward'][index] = reward
+        segment['next_state'][index] = state_row(next_state, self.state_size)
+        segment['done'][index] = done
+        self.fill += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def sample(self, batch_size):
+        indices = np.random.randint(0, len(self), size=batch_size)
+        segment_numbers = indices // self.segment_size
+        offsets = indices % self.segment_size
+        records = np.empty(batch_size, dtype=self.dtype)
+        for number in np.unique(segment_numbers):
+            mask = segment_numbers == number
+            records[mask] = self.segments[number][1][offsets[mask]]
+        return (np.ascontiguousarray(records['state']), records['action'], records['reward'],
+                np.ascontiguousarray(records['next_state']), records['done'], indices,
+                np.ones(batch_size, dtype=np.float32))
+
+    def update_priorities(self, indices, td_errors):
+        pass
+
+    def flush(self):
+        """
+        把最后一段写回磁盘并更新 meta.json
+        """
+        if self.segments:
+            self.segments[-1][1].flush()
+        self._save_meta()
+        self._unflushed = 0
+
+    def state_dict(self):
+        """
+        经验本身已经在磁盘上，检查点中只记录目录；写检查点前先 flush
+        """
+        self.flush()
+        return {'directory': self.directory}
+
+    def load_state_dict(self, state):
+        # 构造时已经从目录中打开了最近一次 flush 的经验
+        if os.path.abspath(state['directory']) != os.path.abspath(self.directory):
+            raise ValueError(f"Checkpoint replay directory {state['directory']} differs from {self.directory}")
+
+    def close(self):
+        self.flush()
+        self.segments = []
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+# 脚本都在 agent 目录下运行（from env.xxx import ...），测试也把 agent 目录放到导入路径上
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if AGENT_DIR not in sys.path:
+    sys.path.insert(0, AGENT_DIR)
+
+DATA_FILE = os.path.join(AGENT_DIR, '..', 'data_change', 'segment01-min.csv')
+
+
+def greedy_action(state):
+    """
+    沿距离较大的方向朝目标位置移动的动作，用于不依赖网络的确定性运行
+    """
+    (agent_x, agent_y), (target_x, target_y) = state['agent_position'], state['target_positions']
+    distance_x, distance_y = target_x - agent_x, target_y - agent_y
+    if abs(distance_x) > abs(distance_y):
+        return 3 if distance_x > 0 else 2
+    return 1 if distance_y > 0 else 0
+
+
+@pytest.fixture
+def yard(tmp_path):
+    """
+    用 segment01-min.csv 填充的场地，记录文件写到临时目录
+    """
+    from env.exit_journal import ExitJournal
+    from env.step_log import StepLogWriter
+    from env.tracing import Tracer
+    from training_env import make_env
+
+    env = make_env(DATA_FILE, tracer=Tracer.quiet(), step_log=StepLogWriter(str(tmp_path / 'steps.csv')),
+                   exit_journal=ExitJournal(str(tmp_path / 'out_list.csv')))
+    yield env
+    env.close()
@@ -0,0 +1,40 @@
+import pickle
+
+import pytest
+
+from checkpoint import Checkpointer, load_checkpoint
+
+
+class PolicyState:
+    """
+    只提供 state_dict 的 agent，检查点测试不需要 TensorFlow
+    """
+
+    def __init__(self, state):
+        self.state = state
+
+    def state_dict(self):
+        return self.state
+
+
+def test_keeps_latest_checkpoints(tmp_path, yard):
+    checkpointer = Checkpointer(str(tmp_path / 'checkpoints'), keep=2)
+    for episode in range(4):
+        checkpointer.save(PolicyState({'episode': episode}), yard, episode)
+    checkpointer.close()
+    paths = checkpointer.checkpoints()
+    assert len(paths) == 2
+    assert load_checkpoint(paths[-1])['agent'] == {'episode': 3}
+
+
+def test_failed_write_is_raised_by_next_save(tmp_path, yard):
+    checkpointer = Checkpointer(str(tmp_path / 'checkpoints'))
+    checkpointer.save(PolicyState({'policy': lambda: None}), yard, 0)  # 无法序列化，后台写盘失败
+    with pytest.raises((pickle.PicklingError, AttributeError)):
+        checkpointer.save(PolicyState({}), yard, 1)
+    checkpointer.close()
+
+
+def test_rejects_keep_below_one(tmp_path):
+    with pytest.raises(ValueError):
+        Checkpointer(str(tmp_path), keep=0)
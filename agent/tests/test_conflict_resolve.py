@@ -0,0 +1,74 @@
+import os
+import random
+from random import choice
+
+import pytest
+
+from conftest import AGENT_DIR, DATA_FILE, greedy_action
+from env.envv import WarehouseEnvironment
+from env.exit_journal import ExitJournal
+from env.step_log import StepLogWriter
+from env.tracing import Tracer
+from training_env import add_items_from_csv
+
+
+class ReferenceEnvironment(WarehouseEnvironment):
+    """
+    逐个物品调用 check_collision 的原始冲突检测，作为 conflict_resolve 的对照
+    """
+
+    def conflict_resolve(self, reward):
+        if self.agent_has_item is True:
+            for other_item in list(self.items.values()):
+                if other_item.item_id.strip('agent_') != self.agent.item_id.strip(
+                        'agent_') and self.check_collision(self.agent, other_item):
+                    tag_conflict = self.conflict_count
+                    choice([self.handle_conflict_1, self.handle_conflict_2, self.handle_conflict_3])(other_item)
+                    reward -= 25 * (self.conflict_count - tag_conflict)
+        return reward
+
+
+def greedy_run(env_class, tmp_path, csv_file, seed, steps=1500):
+    env = env_class(width=250, height=200, number=90, time='2024/4/26', tracer=Tracer.quiet(),
+                    step_log=StepLogWriter(str(tmp_path / f'{env_class.__name__}_steps.csv')),
+                    exit_journal=ExitJournal(str(tmp_path / f'{env_class.__name__}_out_list.csv')))
+    env.setRoads('right')
+    env.initialize_segment(92, 58, 70, 20, 16, 12)
+    add_items_from_csv(env, csv_file)
+    random.seed(seed)
+    rewards = []
+    for _ in range(steps):
+        action = greedy_action(env.get_state())
+        try:
+            rewards.append(env.step(action)[1])
+        except (AttributeError, KeyError) as error:
+            # 原有的处理流程在部分路径上会出错（agent 为 None、移走已经不在场地中的分段），两种实现要在同一步以同样的错误停止
+            rewards.append(type(error).__name__)
+            break
+    result = (rewards, env.conflict_count, [item.item_id for item in env.out_list],
+              sorted((item.item_id, item.x, item.y) for item in env.items.values()))
+    env.close()
+    return result
+
+
+@pytest.fixture
+def full_data_file(tmp_path):
+    # segment01.csv 是 GBK 编码，add_items_from_csv 按默认编码读取，先转成 UTF-8
+    path = tmp_path / 'segment01.csv'
+    with open(os.path.join(AGENT_DIR, '..', 'data_change', 'segment01.csv'), encoding='gbk') as source:
+        path.write_text(source.read(), encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_matches_whole_yard_scan(tmp_path, seed):
+    expected = greedy_run(ReferenceEnvironment, tmp_path, DATA_FILE, seed)
+    assert expected[1] > 0  # 这条路径上确实处理了冲突
+    assert greedy_run(WarehouseEnvironment, tmp_path, DATA_FILE, seed) == expected
+
+
+@pytest.mark.parametrize('seed', [9, 11])
+def test_handles_items_moved_out_during_resolution(tmp_path, full_data_file, seed):
+    # 这些路径上处理冲突时移出场地的分段仍会与 agent 相交，原始实现会继续处理它们
+    expected = greedy_run(ReferenceEnvironment, tmp_path, full_data_file, seed)
+    assert greedy_run(WarehouseEnvironment, tmp_path, full_data_file, seed) == expected
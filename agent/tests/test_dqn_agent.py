@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+from dqn_agent import DQNAgent  # noqa: E402
+from training_env import ACTION_SIZE, STATE_SIZE, state_array  # noqa: E402
+
+
+def test_train_step_batch_shapes():
+    agent = DQNAgent(STATE_SIZE, ACTION_SIZE)
+    for i in range(40):
+        state = np.full((1, STATE_SIZE), i, dtype=np.float32)
+        agent.remember(state, i % ACTION_SIZE, 1.0, state + 1, False)
+    states, actions, rewards, next_states, dones, _, weights = agent.memory.sample(32)
+    td_errors = agent.train_step(states, actions, rewards, next_states, dones, weights)
+    assert td_errors.shape == (32,)
+    agent.train()
+    assert agent.train_steps == 1
+
+
+def test_remember_and_train_on_env_states(yard):
+    agent = DQNAgent(STATE_SIZE, ACTION_SIZE)
+    agent_position, target_position, state = state_array(yard.get_state())
+    for count in range(40):
+        action = agent.choose_action(state, agent_position, target_position, count)
+        next_state, reward, done, _ = yard.step(action)
+        agent_position, target_position, next_state = state_array(next_state)
+        agent.remember(state, action, reward, next_state, done)
+        agent.train()
+        state = next_state
+    assert agent.train_steps > 0
+
+
+def test_policy_copy_follows_broadcast_weights():
+    learner = DQNAgent(STATE_SIZE, ACTION_SIZE, use_q_values=True)
+    actor = DQNAgent(STATE_SIZE, ACTION_SIZE, use_q_values=True, learner=False)
+    assert actor.memory is None and actor.target_model is None
+    actor.model.set_weights(learner.model.get_weights())
+    actor.epsilon = 0.0
+    state = np.array([[0, 0, 10, 0]], dtype=np.float32)
+    q_values = learner.q_values(state)[0]
+    expected = 3 if q_values[3] > q_values[2] else 2
+    assert actor.choose_action(state, state[0, :2], state[0, 2:], 0) == expected
@@ -0,0 +1,37 @@
+import pytest
+
+from env.envv import Item, WarehouseEnvironment
+from env.exit_journal import ExitJournal, read_journal
+from env.sim_time import parse_time
+from env.tracing import Tracer
+
+
+def delivered(item_id):
+    return Item(item_id, 0, 0, 10, 10, parse_time('2024/4/20'), 5, parse_time('2024/5/1'), 0, 'red')
+
+
+def test_rejects_second_journal_for_the_same_file(tmp_path):
+    path = str(tmp_path / 'out_list.csv')
+    journal = ExitJournal(path)
+    journal.append(delivered('A001'), parse_time('2024/5/1'))
+    with pytest.raises(ValueError):
+        ExitJournal(path)
+    journal.close()
+    # 关闭之后可以重新打开并继续追加
+    journal = ExitJournal(path)
+    journal.append(delivered('A002'), parse_time('2024/5/2'))
+    journal.close()
+    assert [row['item_id'] for row in read_journal(path)] == ['A001', 'A002']
+
+
+def test_default_journals_are_separate_per_env(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    envs = [WarehouseEnvironment(width=100, height=100, number=10, time='2024/4/26', tracer=Tracer.quiet())
+            for _ in range(3)]
+    for index, env in enumerate(envs):
+        env.exit_journal.append(delivered(f'A00{index}'), parse_time('2024/5/1'))
+    paths = {env.exit_journal.path for env in envs}
+    assert len(paths) == 3
+    for env in envs:
+        env.close()
+    assert sorted(row['item_id'] for path in paths for row in read_journal(path)) == ['A000', 'A001', 'A002']
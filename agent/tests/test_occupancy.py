@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from env.envv import WarehouseEnvironment
+from env.exit_journal import ExitJournal
+from env.occupancy import FREE, ROAD_CODES, OccupancyGrid, _intersects
+from env.step_log import StepLogWriter
+from env.tracing import Tracer
+
+
+@pytest.fixture
+def two_road_yard(tmp_path):
+    # 上下都有道路时 check_item 把场地高度改为 173
+    env = WarehouseEnvironment(width=100, height=200, number=20, time='2024/4/26', tracer=Tracer.quiet(),
+                               step_log=StepLogWriter(str(tmp_path / 'steps.csv')),
+                               exit_journal=ExitJournal(str(tmp_path / 'out_list.csv')))
+    env.setRoads('right', 'top', 'bottom')
+    env.initialize_segment(92, 58, 70, 20, 16, 12)
+    env.check_item('a', 0, 0, 20, 30, '2024/4/20', 5, '2024/5/1', 0)
+    env.check_item('b', 0, 0, 16, 30, '2024/4/20', 5, '2024/5/1', 0)
+    yield env
+    env.close()
+
+
+def test_grid_follows_two_road_height(two_road_yard):
+    env = two_road_yard
+    grid = env.grid
+    assert env.height == grid.height == 173
+    assert grid.cells.shape == (173 + 20, 100 + 20)
+    assert (grid.cells[173:, :] == ROAD_CODES['bottom']).all()
+    assert (grid.cells[:20, :100] == ROAD_CODES['top']).all()
+    assert grid.cells[172, 50] == FREE
+    assert not grid.is_free(0, 170, 10, 180, roads=True)
+    assert grid.is_free(50, 150, 60, 173, roads=True)
+    for item in env.items.values():
+        assert grid.item_at(item.x, item.y) is item
+    assert env.render_frame().shape == (193, 120, 3)
+
+
+def test_resize_repaints_registered_items():
+    grid = OccupancyGrid(50, 50)
+    grid.set_roads([{'name': 'bottom', 'height': 20, 'color': 'lightyellow'}])
+
+    class Segment:
+        x, y, width, length, color = 5, 5, 10, 10, 'red'
+
+        def get_rectangle(self):
+            return self.x, self.y, self.x + self.width, self.y + self.length
+
+    segment = Segment()
+    grid.add((5, 5), segment)
+    grid.resize(50, 30)
+    assert grid.cells.shape == (50, 50)
+    assert grid.item_at(5, 5) is segment
+    assert (grid.cells[30:] == ROAD_CODES['bottom']).all()
+    grid.remove((5, 5))
+    assert grid.is_free(0, 0, 50, 30)
+
+
+def test_overlapping_matches_check_collision(yard):
+    rng = np.random.default_rng(0)
+    items = list(yard.items.values())  # items 的顺序就是登记顺序
+    orders = [yard.grid.order(key) for key in yard.items]
+    for _ in range(200):
+        left, top = rng.integers(0, yard.width), rng.integers(0, yard.height)
+        rectangle = (left, top, left + rng.integers(1, 60), top + rng.integers(1, 40))
+        after = int(rng.choice(orders))
+        expected = [item for order, item in zip(orders, items)
+                    if order > after and _intersects(item.get_rectangle(), rectangle)]
+        assert [item for _, item in yard.grid.overlapping(*rectangle, after=after)] == expected
+
+
+class Segment:
+    color = 'red'
+
+    def __init__(self, x, y, width, length):
+        self.x, self.y, self.width, self.length = x, y, width, length
+
+    def get_rectangle(self):
+        return self.x, self.y, self.x + self.width, self.y + self.length
+
+
+@pytest.mark.parametrize('roads', [True, False])
+def test_first_free_x_matches_brute_force(roads):
+    rng = np.random.default_rng(1)
+    grid = OccupancyGrid(120, 60)
+    grid.set_roads([{'name': 'right', 'width': 20, 'color': 'lightgray'}])
+    segments = []
+    for index in range(25):
+        # 分段之间可以重叠，移走其中一些后格子要按剩下的分段计算
+        segment = Segment(int(rng.integers(0, 110)), int(rng.integers(0, 55)), int(rng.integers(2, 25)),
+                          int(rng.integers(2, 15)))
+        grid.add(index, segment)
+        segments.append(segment)
+    for index in range(0, 25, 4):
+        grid.remove(index)
+    remaining = [segment for index, segment in enumerate(segments) if index % 4]
+    limit = 120 if roads else 140  # 右侧道路占 [120, 140)
+    for _ in range(300):
+        y, length = int(rng.integers(0, 55)), int(rng.integers(1, 6))
+        width, start = int(rng.integers(1, 30)), int(rng.integers(0, 100))
+        expected = next((x for x in range(start, limit - width + 1)
+                         if not any(_intersects(segment.get_rectangle(), (x, y, x + width, y + length))
+                                    for segment in remaining)), None)
+        assert grid.first_free_x(y, length, width, start, roads=roads) == expected
+
+
+def test_first_free_x_rejects_empty_width():
+    with pytest.raises(ValueError):
+        OccupancyGrid(10, 10).first_free_x(0, 1, 0)
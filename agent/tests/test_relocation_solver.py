@@ -0,0 +1,42 @@
+import pytest
+
+from env.envv import WarehouseEnvironment
+from env.exit_journal import ExitJournal
+from env.sim_time import parse_time
+from env.step_log import StepLogWriter
+from env.tracing import Tracer
+from relocation_solver import HOLD, RELOCATE, BlockRelocationSolver, replay
+
+
+def make_yard(tmp_path, items, width=100):
+    env = WarehouseEnvironment(width=width, height=100, number=20, time='2024/4/26', tracer=Tracer.quiet(),
+                               step_log=StepLogWriter(str(tmp_path / 'steps.csv')),
+                               exit_journal=ExitJournal(str(tmp_path / 'out_list.csv')))
+    env.setRoads('right')
+    env.initialize_segment(92, 58, 70, 20, 16, 12)
+    for item_id, length, width, exit_time in items:
+        env.check_item(item_id, 0, 0, length, width, '2024/4/20', 5, exit_time, 0)
+    return env
+
+
+@pytest.fixture
+def edge_yard(tmp_path):
+    # a2 压在先出场的 a1 上面；移到 c1 那一行后右边缘是 x = 92，仍在道路 (x = 100) 之前
+    env = make_yard(tmp_path, [('a1', 18, 40, '2024/5/1'), ('a2', 18, 40, '2024/5/9'), ('c1', 20, 50, '2024/5/9')])
+    yield env
+    env.close()
+
+
+def test_relocates_up_to_the_road(edge_yard):
+    schedule = BlockRelocationSolver().solve(edge_yard, until=parse_time('2024/5/1'))
+    assert schedule.relocations == 1 and schedule.optimal
+    relocation = schedule.moves[0]
+    assert relocation.kind == RELOCATE and relocation.item_id == 'a2'
+    assert relocation.destination == (52, 1)
+    assert all(move.kind != HOLD for move in schedule.moves)
+
+
+def test_replay_keeps_items_inside_the_yard(edge_yard):
+    replay(edge_yard, BlockRelocationSolver().solve(edge_yard, until=parse_time('2024/5/1')))
+    assert sorted(item.item_id for item in edge_yard.items.values()) == ['a2', 'c1']
+    assert all(item.x + item.width <= edge_yard.width for item in edge_yard.items.values())
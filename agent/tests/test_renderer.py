@@ -0,0 +1,33 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+from env.envv import WarehouseEnvironment  # noqa: E402
+from env.exit_journal import ExitJournal  # noqa: E402
+from env.renderer import SceneRenderer  # noqa: E402
+from env.step_log import StepLogWriter  # noqa: E402
+from env.tracing import Tracer  # noqa: E402
+
+
+def test_duplicate_item_ids_get_their_own_artists(tmp_path):
+    env = WarehouseEnvironment(width=100, height=100, number=20, time='2024/4/26', tracer=Tracer.quiet(),
+                               step_log=StepLogWriter(str(tmp_path / 'steps.csv')),
+                               exit_journal=ExitJournal(str(tmp_path / 'out_list.csv')))
+    env.setRoads('right')
+    env.initialize_segment(92, 58, 70, 20, 16, 12)
+    for _ in range(2):
+        env.check_item('dup', 0, 0, 20, 30, '2024/4/20', 5, '2024/5/1', 0)
+    renderer = SceneRenderer(env, offscreen=True)
+    renderer.update()
+    assert len(renderer.artists) == 2
+    texts = len(renderer.axes.texts)
+
+    first, second = env.items.values()
+    env.remove_item(first)
+    renderer.update()
+    assert len(renderer.artists) == 1
+    (rect, _, _), = renderer.artists.values()
+    assert rect.get_xy() == (second.x, second.y)
+    assert len(renderer.axes.texts) == texts - 1
+    renderer.close()
+    env.close()
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from replay_buffer import ReplayBuffer, state_row
+
+STATE_SIZE = 4
+
+
+def fill(buffer, count):
+    for i in range(count):
+        state = np.full((1, STATE_SIZE), i, dtype=np.float32)
+        buffer.add(state, i % 4, float(i), state + 1, i % 2)
+
+
+@pytest.mark.parametrize('prioritized', [False, True])
+def test_sample_shapes(prioritized):
+    buffer = ReplayBuffer(100, STATE_SIZE, prioritized=prioritized)
+    fill(buffer, 50)
+    states, actions, rewards, next_states, dones, indices, weights = buffer.sample(32)
+    assert states.shape == next_states.shape == (32, STATE_SIZE)
+    assert actions.shape == rewards.shape == dones.shape == indices.shape == weights.shape == (32,)
+    # 每一行的 state、reward、next_state 来自同一条经验
+    np.testing.assert_array_equal(states[:, 0], rewards)
+    np.testing.assert_array_equal(next_states, states + 1)
+
+
+def test_state_row_rejects_wrong_width():
+    assert state_row(np.zeros((1, STATE_SIZE)), STATE_SIZE).shape == (STATE_SIZE,)
+    with pytest.raises(ValueError):
+        state_row(np.zeros((2, 2)), 2)
+    buffer = ReplayBuffer(10, STATE_SIZE)
+    with pytest.raises(ValueError):
+        buffer.add(np.zeros(2), 0, 0.0, np.zeros(2), False)
+
+
+def test_ring_buffer_overwrites_oldest():
+    buffer = ReplayBuffer(8, STATE_SIZE)
+    fill(buffer, 12)
+    assert len(buffer) == 8
+    assert sorted(buffer.rewards) == list(range(4, 12))
@@ -0,0 +1,54 @@
+import random
+
+from conftest import greedy_action
+
+
+def signature(env):
+    agent = env.agent
+    return (sorted((key, item.item_id, item.x, item.y, item.length, item.width) for key, item in env.items.items()),
+            None if agent is None else (agent.item_id, agent.x, agent.y),
+            env.target_position, list(env.task_positions), env.agent_has_item,
+            [item.item_id for item in env.out_list], [item.item_id for item in env.interfering_items],
+            env.conflict_count, env.total_reward, env.current_time, len(env.cache_items),
+            list(env.segment_heights), list(env.y_positions),
+            (env.seg_high_length, env.seg_mid_length, env.seg_low_length), env.grid.cells.tobytes())
+
+
+def rollout(env, seed, steps):
+    random.seed(seed)
+    trace = []
+    for _ in range(steps):
+        try:
+            _, reward, done, _ = env.step(greedy_action(env.get_state()))
+        except (AttributeError, KeyError) as error:
+            trace.append(type(error).__name__)
+            break
+        trace.append((reward, done, signature(env)))
+    return trace
+
+
+def test_restore_replays_the_same_steps(yard):
+    rollout(yard, 0, 20)
+    snapshot = yard.snapshot()
+    before = signature(yard)
+    first = rollout(yard, 0, 300)
+    assert any(entry[2][8] > before[8] for entry in first if isinstance(entry, tuple))  # 这段路径上处理了冲突
+    for _ in range(2):
+        # 同一个快照可以恢复多次
+        yard.restore(snapshot)
+        assert signature(yard) == before
+        assert rollout(yard, 0, 300) == first
+
+
+def test_restore_undoes_new_rows(yard):
+    snapshot = yard.snapshot()
+    before = signature(yard)
+    for height in range(1, 20):
+        if height not in yard.row_of_height:
+            yard.divide_seg(height)
+    yard.rebuild_layout()
+    assert signature(yard) != before
+    yard.restore(snapshot)
+    if yard.layout_dirty:
+        yard.rebuild_layout()
+    assert signature(yard) == before
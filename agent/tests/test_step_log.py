@@ -0,0 +1,34 @@
+import pytest
+
+from env.envv import WarehouseEnvironment
+from env.step_log import StepLogWriter, read_step_log
+from env.tracing import Tracer
+
+
+def test_rejects_second_writer_for_the_same_file(tmp_path):
+    path = str(tmp_path / 'steps.csv')
+    writer = StepLogWriter(path)
+    with pytest.raises(ValueError):
+        StepLogWriter(path)
+    writer.close()
+    StepLogWriter(path).close()
+
+
+def test_binary_rows_round_trip(tmp_path):
+    path = str(tmp_path / 'steps.bin')
+    writer = StepLogWriter(path, fmt='binary', flush_rows=2)
+    for step in range(5):
+        writer.append(step, step % 4, (step, 1), (10, 1), float(step), 0.0, 0)
+    writer.close()
+    records = read_step_log(path)
+    assert list(records['time']) == list(range(5))
+    assert list(records['action']) == [0, 1, 2, 3, 0]
+
+
+def test_default_logs_are_separate_per_env(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    envs = [WarehouseEnvironment(width=100, height=100, number=10, time='2024/4/26', tracer=Tracer.quiet())
+            for _ in range(3)]
+    assert len({env.step_log.path for env in envs}) == 3
+    for env in envs:
+        env.close()
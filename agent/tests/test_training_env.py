@@ -0,0 +1,23 @@
+import numpy as np
+
+from replay_buffer import ReplayBuffer
+from training_env import STATE_SIZE, state_array
+
+
+def test_state_array_is_one_row(yard):
+    agent_position, target_position, state = state_array(yard.get_state())
+    assert state.shape == (1, STATE_SIZE)
+    np.testing.assert_array_equal(state[0], np.concatenate([agent_position, target_position]))
+
+
+def test_env_transitions_fill_replay_buffer(yard):
+    buffer = ReplayBuffer(100, STATE_SIZE)
+    _, _, state = state_array(yard.get_state())
+    for step in range(40):
+        next_state, reward, done, _ = yard.step(step % 4)
+        _, _, next_state = state_array(next_state)
+        buffer.add(state, step % 4, reward, next_state, done)
+        state = next_state
+    states, actions, rewards, next_states, dones, _, _ = buffer.sample(32)
+    assert states.shape == next_states.shape == (32, STATE_SIZE)
+    assert actions.shape == rewards.shape == dones.shape == (32,)
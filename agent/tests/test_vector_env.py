@@ -0,0 +1,129 @@
+import csv
+import random
+
+import numpy as np
+
+from conftest import DATA_FILE
+from env.exit_journal import ExitJournal
+from env.step_log import STEP_FIELDS, StepLogWriter
+from env.tracing import Tracer
+from env.vector_env import VectorWarehouseEnvironment, forward_distances, move_agents
+from training_env import make_env
+
+
+def yard_factory(directory, name):
+    return lambda: make_env(DATA_FILE, tracer=Tracer.quiet(),
+                            step_log=StepLogWriter(str(directory / f'{name}_steps.csv')),
+                            exit_journal=ExitJournal(str(directory / f'{name}_out.csv')))
+
+
+def batch_actions(observations, explore, random_actions):
+    distance_x = observations[:, 2] - observations[:, 0]
+    distance_y = observations[:, 3] - observations[:, 1]
+    greedy = np.where(np.abs(distance_x) > np.abs(distance_y),
+                      np.where(distance_x > 0, 3, 2), np.where(distance_y > 0, 1, 0))
+    return np.where(explore, random_actions, greedy)
+
+
+def serial_rollout(envs, explore, random_actions):
+    """
+    逐个场地调用 step，done 和异常的处理与 VectorWarehouseEnvironment 相同
+    """
+    for env in envs:
+        env.save_initial_state()
+    observations = np.array([(env.agent.x, env.agent.y) + env.target_position for env in envs], dtype=float)
+    trace = []
+    for step in range(len(explore)):
+        actions = batch_actions(observations, explore[step], random_actions[step])
+        rewards, dones = [], []
+        for index, env in enumerate(envs):
+            try:
+                _, reward, done, _ = env.step(int(actions[index]))
+            except (AttributeError, KeyError):
+                reward, done = 0, True
+                env.reset()
+            else:
+                if done and not env.items and not env.cache_items:
+                    env.reset()
+            rewards.append(reward)
+            dones.append(done)
+            observations[index] = (env.agent.x, env.agent.y) + env.target_position
+        trace.append((observations.tolist(), rewards, dones))
+    return trace
+
+
+def read_steps(path):
+    # elapsed_time 是主机耗时，两次运行不会相同
+    with open(path, newline='') as file:
+        elapsed = STEP_FIELDS.index('elapsed_time')
+        return [row[:elapsed] + row[elapsed + 1:] for row in csv.reader(file)]
+
+
+def test_matches_serial_environments(tmp_path):
+    num_envs, steps = 4, 600
+    rng = np.random.default_rng(0)
+    explore = rng.random((steps, num_envs)) < 0.2
+    random_actions = rng.integers(0, 4, (steps, num_envs))
+
+    random.seed(0)
+    serial = [yard_factory(tmp_path, f'serial{index}')() for index in range(num_envs)]
+    expected = serial_rollout(serial, explore, random_actions)
+    conflicts = sum(env.conflict_count for env in serial)
+    for env in serial:
+        env.close()
+
+    random.seed(0)
+    envs = VectorWarehouseEnvironment([yard_factory(tmp_path, f'vector{index}') for index in range(num_envs)])
+    observations = envs.get_state()
+    trace = []
+    for step in range(steps):
+        observations, rewards, dones, _ = envs.step(batch_actions(observations, explore[step], random_actions[step]))
+        trace.append((observations.tolist(), rewards.tolist(), dones.tolist()))
+    envs.close()
+
+    assert trace == expected
+    assert conflicts > 0 and any(any(dones) for _, _, dones in expected)
+    for index in range(num_envs):
+        assert read_steps(tmp_path / f'vector{index}_steps.csv') == read_steps(tmp_path / f'serial{index}_steps.csv')
+        assert (tmp_path / f'vector{index}_out.csv').read_text() == (tmp_path / f'serial{index}_out.csv').read_text()
+
+
+def test_batched_movement_matches_env(yard):
+    distances = np.arange(0, 260)
+    expected = []
+    for distance in distances:
+        yard.agent.x, yard.agent.y = 0, 0
+        yard.target_position = (int(distance), int(distance) % 210)
+        expected.append(yard.binary_forward())
+    move_x, move_y = forward_distances(distances, distances % 210, yard.width, yard.height)
+    assert list(zip(move_x.tolist(), move_y.tolist())) == expected
+
+    positions = np.array([(0, 0), (245, 190), (120, 197), (3, 4), (250, 100)])
+    for action in range(5):
+        moved = move_agents(np.full(len(positions), action), positions, np.full(len(positions), 5),
+                            np.full(len(positions), 10), np.full(len(positions), 10), yard.width, yard.height)
+        for (x, y), position in zip(positions.tolist(), moved.tolist()):
+            yard.agent.x, yard.agent.y = x, y
+            yard.agent_move(action, 10, 10)
+            assert [yard.agent.x, yard.agent.y] == position
+
+
+def test_failing_yard_is_reset(tmp_path):
+    envs = VectorWarehouseEnvironment([yard_factory(tmp_path, f'yard{index}') for index in range(2)])
+    initial = envs.get_state()
+    for _ in range(5):
+        envs.step([3, 3])
+
+    def fail(action):
+        raise KeyError(action)
+
+    envs.envs[0].step = fail
+    moved = envs.get_state()
+    # 无效动作一定交给 WarehouseEnvironment.step 处理
+    observations, rewards, dones, infos = envs.step([4, 3])
+    assert dones[0] and isinstance(infos[0]['error'], KeyError)
+    assert infos[0]['terminal_observation'].tolist() == moved[0].tolist()
+    assert observations[0].tolist() == initial[0].tolist()
+    assert not dones[1] and 'error' not in infos[1]
+    del envs.envs[0].step
+    envs.close()
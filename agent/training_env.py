@@ -0,0 +1,55 @@
+import csv
+
+import numpy as np
+
+from env.envv import WarehouseEnvironment
+from env.sim_time import parse_time
+
+STATE_SIZE = 4  # [agent_x, agent_y, target_x, target_y]
+ACTION_SIZE = 4  # 上移、下移、左移、右移
+
+
+def state_array(state):
+    """
+    把 env.get_state() 的字典转成网络的输入，返回 (agent_position, target_position, (1, STATE_SIZE) 的状态行)
+    """
+    agent_position = np.array(list(state['agent_position']))
+    target_position = np.array(list(state['target_positions']))
+    return agent_position, target_position, np.reshape(np.concatenate([agent_position, target_position]),
+                                                       [1, STATE_SIZE]).astype(np.float32)
+
+
+def add_items_from_csv(env, csv_file):
+    with open(csv_file, 'r') as file:
+        csv_reader = csv.reader(file)
+        next(csv_reader)  # 跳过 CSV 文件的标题行
+
+        for row in csv_reader:
+            item_id = row[0]
+            x = int(row[1])
+            y = int(row[2])
+            length = int(row[3])
+            width = int(row[4])
+            # 日期在读入时解析一次，环境内部只使用整数时间
+            start_time = parse_time(str(row[6]))
+            exit_time = parse_time(str(row[7]))
+            processing_time = 5
+            if row[12] == '':
+                time_remian = 0
+            else:
+                time_remian = int(row[12])
+
+            # 添加物品到环境
+            env.check_item(item_id, x, y, length, width, start_time, processing_time, exit_time, time_remian)
+
+
+def make_env(csv_file='../data_change/segment01-min.csv', **kwargs):
+    """
+    创建并填充场地，kwargs 传给 WarehouseEnvironment（tracer、step_log、exit_journal）
+    """
+    env = WarehouseEnvironment(width=250, height=200, number=90, time='2024/4/26', **kwargs)
+    env.setRoads('right')
+    env.initialize_segment(92, 58, 70, 20, 16, 12)
+
+    add_items_from_csv(env, csv_file)
+    return env